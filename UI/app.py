@@ -1,21 +1,48 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
-from flask_bcrypt import Bcrypt
-from pymongo import MongoClient
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from pymongo.errors import DuplicateKeyError
 from bson.objectid import ObjectId
 import os
+import sys
 from flask import url_for
 import uuid
 from flask import send_from_directory
 
+# repository.py, mongo.py, indexes.py 는 저장소 최상위의 공용 모듈을 사용 (메인 앱과 같은 파일)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from indexes import BASIC_INDEXES, ensure_indexes, register_cli as register_index_cli
+from hashing import PasswordHasher, HasherBusy, calibrate_rounds
+from mongo import Mongo, configure as configure_mongo
+from repository import Message, SnapshotMigration, make_repositories, register_cli as register_migration_cli
+
 app = Flask(__name__)
 app.secret_key = 'your_secret_key'  # 세션 데이터 암호화에 사용되는 비밀 키 설정
-bcrypt = Bcrypt(app)  # 비밀번호 암호화를 위한 Bcrypt 설정
 
-# MongoDB 클라이언트 설정
-client = MongoClient('localhost', 27017)
-db = client['rollingpaper']  # 사용할 데이터베이스 이름 설정
-users_collection = db['users']  # 사용자 컬렉션 설정
-messages_collection = db['messages']  # 메시지 컬렉션 설정
+# 비밀번호 암호화(bcrypt)는 CPU를 오래 쓰므로 요청 스레드가 아닌 별도 프로세스 풀에서 실행
+app.config['HASH_WORKERS'] = int(os.getenv('HASH_WORKERS', 2))  # 해싱 프로세스 수
+app.config['HASH_QUEUE'] = int(os.getenv('HASH_QUEUE', 16))  # 이보다 많이 밀리면 503
+app.config['HASH_TARGET_MS'] = float(os.getenv('HASH_TARGET_MS', 250))  # 해시 한 번에 걸리는 목표 시간
+# cost를 직접 정하지 않으면 시작할 때 이 서버에서 목표 시간에 맞게 측정
+app.config['BCRYPT_LOG_ROUNDS'] = int(os.getenv('BCRYPT_LOG_ROUNDS') or calibrate_rounds(app.config['HASH_TARGET_MS']))
+bcrypt = PasswordHasher(
+    max_workers=app.config['HASH_WORKERS'],
+    max_queue=app.config['HASH_QUEUE'],
+    rounds=app.config['BCRYPT_LOG_ROUNDS']
+)
+
+# MongoDB 클라이언트 설정 (MONGODB_URI, MONGO_MAX_POOL_SIZE 등) - 처음 사용할 때 프로세스마다 연결
+configure_mongo(app, default_uri='mongodb://localhost:27017', default_dbname='rollingpaper')  # 로컬 개발용 (계정 없음)
+mongo = Mongo(app)
+db = mongo.db  # 사용할 데이터베이스
+
+# 필요한 인덱스 생성 (indexes.py 에 등록된 목록 중 이 앱에서 쓰는 것) - 연결될 때 실행
+@mongo.on_connect
+def ensure_app_indexes(db):
+    return ensure_indexes(db, BASIC_INDEXES)
+
+# 사용자/쪽지 조회와 변경은 repository.py 를 거쳐서 (필요한 필드만 조회해서 User/Message 객체로 반환)
+# 'mongo': users/messages 컬렉션, 'memory': 프로세스 안 dict (테스트/벤치마크용)
+app.config['REPOSITORY_BACKEND'] = os.getenv('REPOSITORY_BACKEND', 'mongo')
+user_repository, message_repository = make_repositories(app.config['REPOSITORY_BACKEND'], db)
 
 # 파일 업로드 설정
 UPLOAD_FOLDER = 'static/uploads'
@@ -23,6 +50,14 @@ ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'mp3', 'wav', '
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# 이름/닉네임을 바꿀 때 쪽지에 저장된 이름 사본을 한 번에 고치는 쪽지 수
+SNAPSHOT_BATCH_SIZE = 500
+
+@app.errorhandler(HasherBusy)
+def hasher_busy(e):
+    # 로그인이 몰려 해싱이 밀려 있으면 잠시 후 다시 시도하도록 안내 (다른 페이지는 계속 응답)
+    return '요청이 많아 잠시 후 다시 시도해 주세요.', 503, {'Retry-After': str(e.retry_after)}
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
@@ -37,10 +72,10 @@ def login():
     username = request.form['username']  # 입력된 사용자 이름 가져오기
     password = request.form['password']  # 입력된 비밀번호 가져오기
 
-    user = users_collection.find_one({'username': username})  # 사용자 이름으로 DB에서 사용자 찾기
-    if user and bcrypt.check_password_hash(user['password'], password):  # 사용자가 존재하고 비밀번호가 일치하면
+    user, stored_password = user_repository.credentials(username)  # 사용자 이름으로 DB에서 사용자 찾기
+    if user and bcrypt.check_password_hash(stored_password, password):  # 사용자가 존재하고 비밀번호가 일치하면
         session['username'] = username  # 세션에 사용자 이름 저장
-        session['nickname'] = user['nickname']  # 닉네임을 세션에 저장
+        session['nickname'] = user.nickname  # 닉네임을 세션에 저장
         return redirect(url_for('users'))  # 유저 목록 페이지로 리다이렉트
     error = '잘못된 유저네임 또는 비밀번호 입니다.'
     return render_template('login.html', error=error)
@@ -52,12 +87,11 @@ def register():
     name = request.form['name']
     nickname = request.form['nickname']
 
-    existing_user = users_collection.find_one({'username': username})
-    if existing_user:
+    if user_repository.exists(username):
         error = '이미 존재하는 아이디입니다.'
         return render_template('login.html', error=error)
 
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    hashed_password = bcrypt.generate_password_hash(password)
 
     profile_pic = request.files['profile_pic']  # 업로드된 프로필 사진 파일 가져오기
     profile_pic_filename = None
@@ -68,13 +102,11 @@ def register():
         profile_pic.save(profile_pic_path)
         profile_pic_filename = f"uploads/{filename}"
 
-    users_collection.insert_one({
-        'username': username,
-        'password': hashed_password,
-        'name': name,
-        'nickname': nickname,
-        'profile_picture': profile_pic_filename  # 프로필 사진 경로 저장
-    })
+    try:
+        user_repository.create(username, hashed_password, name, nickname, profile_pic_filename)  # 프로필 사진 경로 저장
+    except DuplicateKeyError:  # 동시에 같은 아이디로 가입한 경우 (username unique 인덱스)
+        error = '이미 존재하는 아이디입니다.'
+        return render_template('login.html', error=error)
 
     success = '회원가입이 완료되었습니다.'
     return render_template('login.html', success=success)
@@ -84,7 +116,7 @@ def users():
     if 'username' not in session:  # 사용자가 로그인되어 있지 않으면
         return redirect(url_for('index'))  # 로그인 페이지로 리다이렉트
 
-    users = users_collection.find().sort('name', 1)  # 1은 오름차 -1은 내림차 DB에서 모든 사용자 가져오기
+    users = user_repository.by_name()  # 이름 오름차순으로 모든 사용자 가져오기
     return render_template('users.html', users=users)  # 유저 목록 페이지 렌더링
 
 @app.route('/logout')
@@ -97,18 +129,18 @@ def paper(user_id):
     if 'username' not in session:  # 사용자가 로그인되어 있지 않으면
         return redirect(url_for('index'))  # 로그인 페이지로 리다이렉트
 
-    recipient = users_collection.find_one({'_id': ObjectId(user_id)})
+    recipient = user_repository.get(ObjectId(user_id))
     if not recipient:
         return "User not found", 404
 
-    messages = messages_collection.find({'recipient_id': user_id})
+    messages = message_repository.for_board(user_id)
 
     messages_with_file_url = []
     for message in messages:
-        file_url = message.get('file_url')
+        file_url = message.file_url
         if file_url:
             file_extension = file_url.rsplit('.', 1)[1].lower()
-            message['file_url'] = url_for('static', filename=file_url)
+            message.file_url = url_for('static', filename=file_url)
         messages_with_file_url.append(message)
 
     return render_template('paper.html', messages=messages_with_file_url, recipient=recipient)
@@ -120,8 +152,11 @@ def message():
     
     recipient_id = request.form["recipient_id"]  # 쪽지 받을 사용자 ID 가져오기
     content = request.form["content"]  # 쪽지 내용 가져오기
-    author = session['nickname']  # 사용자 이름을 작성자로 설정
+    author = user_repository.get_by_username(session['username'])  # 로그인한 사용자를 작성자로 설정
+    if author is None:  # 탈퇴했거나 세션이 오래됨
+        return "User not found", 404
     theme = request.form["theme"] #테마 관련
+    recipient = user_repository.get(ObjectId(recipient_id)) if ObjectId.is_valid(recipient_id) else None
 
     file = request.files['file']
     file_url = None
@@ -132,14 +167,15 @@ def message():
         # Use '/' instead of os.path.join for URL paths
         file_url = f"uploads/{filename}"
 
-    messages_collection.insert_one(
-        {
-            "content": content,
-            "recipient_id": recipient_id,
-            'author': author,
-            'file_url': file_url,
-            "theme": theme
-        })  # 메시지 DB에 저장
+    message_repository.insert(Message(
+        content=content,
+        recipient_id=recipient_id,
+        recipient_name=recipient.name if recipient else None,  # 이름 사본 (my_messages 에서 users 조회 없이 표시)
+        author=author.nickname,
+        author_id=author._id,
+        file_url=file_url,
+        theme=theme
+    ))  # 메시지 DB에 저장
 
     return redirect(url_for('paper', user_id=recipient_id))
 
@@ -149,14 +185,9 @@ def update_data():
     id = data.get("id")  # JSON에서 ID 값 추출
     new_x = data.get("newX")  # JSON에서 X 좌표 값 추출
     new_y = data.get("newY")  # JSON에서 Y 좌표 값 추출
-    
-    # MongoDB에서 documents의 'messages' 컬렉션을 선택
-    collection = messages_collection
-    
-    # 'id'가 주어진 item_id와 일치하는 문서를 찾고, 'newx'와 'newy' 필드를 업데이트
-    collection.update_one(
-        {"_id": ObjectId(id)}, {"$set": {"newx": new_x, "newy": new_y}}
-    )
+
+    # 'id'가 주어진 item_id와 일치하는 쪽지의 'newx'와 'newy' 필드를 업데이트
+    message_repository.move(ObjectId(id), new_x, new_y)
     
     return '', 204
 
@@ -165,78 +196,58 @@ def delete_message(message_id):
     if 'username' not in session:  # 사용자가 로그인되어 있지 않으면
         return redirect(url_for('index'))  # 로그인 페이지로 리다이렉트
     
-    message = messages_collection.find_one({'_id': ObjectId(message_id)})
+    message = message_repository.get(ObjectId(message_id))
     if not message:
         flash('메모를 찾을 수 없습니다.')
-        return redirect(url_for('paper', user_id=message['recipient_id']))
+        return redirect(url_for('paper', user_id=message.recipient_id))
 
     # 파일 경로가 존재하면 파일을 삭제합니다.
-    file_url = message.get('file_url')
+    file_url = message.file_url
     if file_url:
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], os.path.basename(file_url))
         if os.path.exists(file_path):
             os.remove(file_path)
     
     # 메모를 삭제합니다.
-    messages_collection.delete_one({'_id': ObjectId(message_id)})
+    message_repository.delete(message._id)
     
-    return redirect(url_for('paper', user_id=message['recipient_id']))
+    return redirect(url_for('paper', user_id=message.recipient_id))
 
 @app.route('/delete_my_message/<message_id>', methods=['POST'])
 def delete_my_message(message_id):
     if 'username' not in session:  # 사용자가 로그인되어 있지 않으면
         return redirect(url_for('index'))  # 로그인 페이지로 리다이렉트
     
-    message = messages_collection.find_one({'_id': ObjectId(message_id)})
+    message = message_repository.get(ObjectId(message_id))
     if not message:
         flash('메모를 찾을 수 없습니다.')
-        return redirect(url_for('paper', user_id=message['recipient_id']))
+        return redirect(url_for('paper', user_id=message.recipient_id))
 
     # 파일 경로가 존재하면 파일을 삭제합니다.
-    file_url = message.get('file_url')
+    file_url = message.file_url
     if file_url:
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], os.path.basename(file_url))
         if os.path.exists(file_path):
             os.remove(file_path)
     
     # 메모를 삭제합니다.
-    messages_collection.delete_one({'_id': ObjectId(message_id)})
+    message_repository.delete(message._id)
     
-    return redirect(url_for('my_messages', user_id=message['recipient_id']))
+    return redirect(url_for('my_messages', user_id=message.recipient_id))
 
 @app.route('/my_messages')
 def my_messages():
     if 'username' not in session:
         return redirect(url_for('index'))
 
-    # 현재 사용자의 닉네임을 가져옵니다.
-    nickname = session['nickname']
-
-    # 현재 사용자가 작성한 모든 쪽지를 가져옵니다.
-    messages = list(messages_collection.find({'author': nickname}))
-
-    # 가져온 쪽지의 recipient_id 리스트를 만듭니다.
-    recipient_ids = [message['recipient_id'] for message in messages]
-    recipient_ids = [ObjectId(id_str) for id_str in recipient_ids]
+    # 현재 사용자를 가져옵니다.
+    user = user_repository.get_by_username(session['username'])
+    if user is None:
+        return "User not found", 404
 
-    # 해당 쪽지를 받은 유저의 이름을 가져옵니다. (recipient_id를 가진 유저 name을 조회)
-    ToUsers = users_collection.find({'_id': {'$in': recipient_ids}}, {'_id': 1, 'name': 1})
-    ToUsers_dict = {str(user['_id']): user.get('name', 'No Name') for user in ToUsers}
+    # 현재 사용자가 작성한 모든 쪽지를 받은 사람 이름과 함께 가져옵니다.
+    final_result = message_repository.authored_by(user._id, nickname=user.nickname)
 
-    # 메시지와 수신자의 이름을 결합합니다.
-    final_result = []
-    for message in messages:
-        recipient_id = str(message['recipient_id'])
-        ToName = ToUsers_dict.get(recipient_id, "Name not found")
-        final_result.append({
-            '_id' : message['_id'],
-            'content': message['content'],
-            'file_url': message.get('file_url'),
-            'author': message['author'],
-            'theme' : message['theme'],
-            'ToName': ToName
-        })
-    
     return render_template('my_messages.html', messages=final_result)
 
 #프로필 수정
@@ -246,13 +257,15 @@ def edit_profile():
         return redirect(url_for('index'))  # 로그인 페이지로 리다이렉트
 
     username = session['username']
-    user = users_collection.find_one({'username': username})  # 세션에서 현재 사용자 가져오기
+    user = user_repository.get_by_username(username)  # 세션에서 현재 사용자 가져오기
+    if user is None:
+        return "User not found", 404
 
     if request.method == 'POST':
         name = request.form['name']
         nickname = request.form['nickname']
         profile_pic = request.files['profile_pic']
-        profile_pic_filename = user['profile_picture']
+        profile_pic_filename = user.profile_picture
 
         if profile_pic and allowed_file(profile_pic.filename):
             if profile_pic_filename:
@@ -265,30 +278,28 @@ def edit_profile():
             profile_pic.save(profile_pic_path)
             profile_pic_filename = f"uploads/{filename}"
 
-        update_fields = {
-            'name': name,
-            'nickname': nickname,
-            'profile_picture': profile_pic_filename
-        }
-
+        new_password_hash = None
         current_password = request.form.get('current_password')
         new_password = request.form.get('new_password')
         confirm_password = request.form.get('confirm_password')
 
         if current_password and new_password and confirm_password:
-            if not bcrypt.check_password_hash(user['password'], current_password):
+            if not bcrypt.check_password_hash(user_repository.password_of(user._id), current_password):
                 flash('현재 비밀번호가 잘못되었습니다.')
                 return render_template('edit_profile.html', user=user)
             if new_password != confirm_password:
                 flash('새 비밀번호가 일치하지 않습니다.')
                 return render_template('edit_profile.html', user=user)
-            hashed_new_password = bcrypt.generate_password_hash(new_password).decode('utf-8')
-            update_fields['password'] = hashed_new_password
+            new_password_hash = bcrypt.generate_password_hash(new_password)
 
-        users_collection.update_one(
-            {'username': username},
-            {'$set': update_fields}
-        )
+        user_repository.update_profile(user._id, name, nickname, profile_pic_filename, password=new_password_hash)
+        if nickname != user.nickname:
+            # 작성한 쪽지에 저장된 닉네임 사본을 배치 단위로 고침
+            while message_repository.sync_author(user._id, nickname, SNAPSHOT_BATCH_SIZE):
+                pass
+        if name != user.name:
+            while message_repository.sync_recipient(str(user._id), name, SNAPSHOT_BATCH_SIZE):
+                pass
 
         session['nickname'] = nickname  # 세션에 닉네임 갱신
         flash('프로필이 성공적으로 변경되었습니다.')
@@ -303,15 +314,14 @@ def delete_profile():
         return redirect(url_for('index'))
     
     username = session['username']
-    user = users_collection.find_one({'username': username})
+    user = user_repository.get_by_username(username)
     if user:
         # 사용자와 관련된 모든 데이터를 삭제
-        users_collection.delete_one({'username': username})
-        messages_collection.delete_many({'author': user['nickname']})
-        messages_collection.delete_many({'recipient_id': str(user['_id'])})
+        user_repository.delete(user._id)
+        message_repository.delete_for_account(user._id, user.nickname, str(user._id))
 
         #프로필사진 파일 삭제
-        profile_picture = user.get('profile_picture')
+        profile_picture = user.profile_picture
         if profile_picture:
             profile_pic_path = os.path.join(app.config['UPLOAD_FOLDER'], os.path.basename(profile_picture))
             if os.path.exists(profile_pic_path):
@@ -326,6 +336,18 @@ def delete_profile():
         flash('회원 탈퇴 실패: 이미 처리된 사용자입니다.')
         return redirect(url_for('edit_profile'))
 
+@app.route('/pool_stats')
+def pool_stats():
+    # MongoDB 커넥션 풀 사용량 (프로세스별 값) / 대기(waits)나 timeouts가 늘면 풀 크기나 워커 수 조정
+    return jsonify(mongo.stats())
+
+# 등록된 인덱스 중 없거나 사용되지 않는 인덱스 확인 (flask --app app indexes)
+register_index_cli(app, db, BASIC_INDEXES)
+
+# 예전 쪽지에 author_id / 받는 사람 이름 사본 채우기 (flask --app app migrate-snapshots)
+snapshot_migration = SnapshotMigration(message_repository, db['counters'])
+register_migration_cli(app, snapshot_migration)
+
 if __name__ == '__main__':
     app.run(debug=True)
 
@@ -0,0 +1,99 @@
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+import bcrypt
+
+
+class HasherBusy(Exception):
+    """해싱 작업이 너무 많이 밀려 있어서 새 요청을 받지 않을 때."""
+
+    def __init__(self, retry_after):
+        super().__init__('password hasher is busy')
+        self.retry_after = retry_after
+
+
+# 프로세스 풀에서 실행되므로 모듈 최상위 함수여야 함 (pickle)
+# flask_bcrypt 와 같은 형식 ($2b$, utf-8 문자열)이라 기존에 저장된 해시도 그대로 확인 가능
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds, prefix=b'2b')).decode('utf-8')
+
+
+def _check(pw_hash, password):
+    pw_hash = pw_hash.encode('utf-8')
+    return hmac.compare_digest(bcrypt.hashpw(password.encode('utf-8'), pw_hash), pw_hash)
+
+
+def calibrate_rounds(target_ms, min_rounds=10, max_rounds=14):
+    # min_rounds 로 한 번 재 보고, round가 1 늘 때마다 시간이 2배가 되는 것으로 목표 시간 이하의 최대 cost 계산
+    start = time.perf_counter()
+    _hash('calibration', min_rounds)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+    return rounds
+
+
+class PasswordHasher:
+    """bcrypt 해싱을 요청 스레드 대신 크기가 정해진 프로세스 풀에서 실행.
+
+    실행 중 + 대기 중인 작업이 max_workers + max_queue 를 넘으면 HasherBusy 를 발생시킨다.
+    timeout 안에 끝나지 않은 작업은 취소하고(이미 실행 중이면 끝날 때까지) 계속 작업 수에 포함한다.
+    """
+
+    def __init__(self, max_workers=2, max_queue=16, rounds=12, timeout=10.0, retry_after=5):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pid != os.getpid():
+                # fork 이후에는 부모 프로세스의 풀과 작업 수를 쓸 수 없으므로 프로세스마다 새로 시작
+                self._executor = None
+                self._inflight = 0
+                self._pid = os.getpid()
+            if self._inflight >= self.max_workers + self.max_queue:
+                raise HasherBusy(self.retry_after)
+            self._inflight += 1
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._done(None)
+            raise
+        # 작업 수는 풀에서 실제로 끝나거나 취소될 때 줄임 (시간 초과로 먼저 응답해도 아직 실행 중일 수 있음)
+        future.add_done_callback(self._done)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()  # 아직 대기 중이면 실행하지 않음
+            raise HasherBusy(self.retry_after)  # 풀이 밀려서 제때 끝나지 않음
+
+    def _done(self, future):
+        with self._lock:
+            self._inflight -= 1
+
+    def generate_password_hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def check_password_hash(self, pw_hash, password):
+        return self._run(_check, pw_hash, password)
+
+    def stats(self):
+        return {'inflight': self._inflight, 'capacity': self.max_workers + self.max_queue, 'rounds': self.rounds}
@@ -0,0 +1,59 @@
+import gzip
+import hashlib
+import os
+import shutil
+
+# gzip으로 미리 압축해 둘 파일 형식 (이미지/영상은 이미 압축되어 있음)
+COMPRESSIBLE_EXTENSIONS = {'css', 'js', 'svg', 'txt', 'html', 'json', 'map'}
+
+
+class AssetManifest:
+    """static 폴더 파일을 내용 해시로 이름 붙인 목록.
+
+    앱 시작 시 한 번 만들고, 'css/output.css' -> 'css/output.<hash>.css' 처럼 url_for('static')의 파일 이름을 바꾼다.
+    압축할 만한 파일은 gzip 버전을 cache_folder에 미리 만들어 둔다.
+    """
+
+    def __init__(self, static_folder, cache_folder, exclude=('uploads',)):
+        self.static_folder = static_folder
+        self.cache_folder = cache_folder
+        self.exclude = set(exclude)
+        self.hashed = {}  # 원래 이름 -> 해시 이름
+        self.original = {}  # 해시 이름 -> (원래 이름, 해시)
+        self.gzipped = {}  # 해시 이름 -> gzip 파일 경로
+
+    def build(self):
+        os.makedirs(self.cache_folder, exist_ok=True)
+        for root, dirs, files in os.walk(self.static_folder):
+            # 업로드 파일(/media 에서 따로 처리)과 숨김 폴더는 제외
+            dirs[:] = [d for d in dirs if not d.startswith('.')
+                       and os.path.relpath(os.path.join(root, d), self.static_folder) not in self.exclude]
+            for name in files:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                self._add(filename, path)
+        return self
+
+    def _add(self, filename, path):
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        base, dot, ext = filename.rpartition('.')
+        hashed = f'{base}.{digest}.{ext}' if dot else f'{filename}.{digest}'
+        self.hashed[filename] = hashed
+        self.original[hashed] = (filename, digest)
+
+        if ext.lower() in COMPRESSIBLE_EXTENSIONS:
+            gz_path = os.path.join(self.cache_folder, hashed.replace('/', '_') + '.gz')
+            if not os.path.exists(gz_path):  # 이름에 해시가 있으므로 이미 있으면 같은 내용
+                tmp_path = gz_path + '.tmp'
+                with open(path, 'rb') as src, gzip.open(tmp_path, 'wb', compresslevel=9) as dst:
+                    shutil.copyfileobj(src, dst)
+                os.replace(tmp_path, gz_path)
+            self.gzipped[hashed] = gz_path
+
+    def url_defaults(self, endpoint, values):
+        # url_for('static', filename=...) 호출 시 해시 이름으로 바꿈
+        if endpoint == 'static' and values.get('filename') in self.hashed:
+            values['filename'] = self.hashed[values['filename']]
@@ -0,0 +1,39 @@
+import os
+import threading
+
+
+class BackgroundThread:
+    """프로세스마다 띄워 두는 daemon 스레드 (count 개, 필요할 때 ensure() 로 시작).
+
+    fork 된 워커 프로세스에는 부모의 스레드가 따라오지 않으므로 pid 가 바뀌었으면 모두 새로 띄우고,
+    같은 프로세스에서 죽은 스레드가 있으면 그 스레드만 다시 띄운다.
+    """
+
+    def __init__(self, target, name, count=1):
+        self.target = target
+        self.name = name
+        self.count = count
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def alive(self):
+        # ensure() 는 목록을 통째로 바꿔 끼우므로 한 번 읽은 목록만 확인
+        threads = self._threads
+        return self._pid == os.getpid() and all(thread is not None and thread.is_alive() for thread in threads)
+
+    def ensure(self):
+        if self.alive():
+            return
+        with self._lock:
+            if self.alive():
+                return
+            # 락 밖에서 alive() 가 읽는 중일 수 있으므로 새 목록을 다 채운 뒤에 바꿔 끼움
+            threads = list(self._threads) if self._pid == os.getpid() else [None] * self.count
+            for i, thread in enumerate(threads):
+                if thread is None or not thread.is_alive():
+                    name = self.name if self.count == 1 else f'{self.name}-{i}'
+                    threads[i] = threading.Thread(target=self.target, name=name, daemon=True)
+                    threads[i].start()
+            self._threads = threads
+            self._pid = os.getpid()
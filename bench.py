@@ -0,0 +1,312 @@
+"""주요 route 성능 측정 (부하 테스트) 스크립트.
+
+가짜 사용자/롤링페이퍼를 만들어 넣고, 여러 클라이언트 스레드로 Flask 앱을 직접 호출해서
+route별 p50/p95/p99 응답 시간, 처리량, 요청당 MongoDB 명령 수를 JSON 파일로 저장한다.
+
+    python bench.py --users 10000 --notes-per-board 1000 --output bench_baseline.json
+    python bench.py --compare bench_baseline.json --output bench_new.json
+    python bench.py --backend memory   # mongod 없이 (명령 수는 측정 안 됨)
+
+--backend memory 는 users/messages 를 REPOSITORY_BACKEND=memory 저장소(dict)에 두고 나머지 컬렉션(counters, jobs 등)만
+mongomock 으로 돌린다. mongomock 은 스레드에 안전하지 않으므로 이때는 클라이언트 스레드를 1개(--clients 1)로 고정한다.
+"""
+import argparse
+import io
+import itertools
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from pymongo.monitoring import CommandListener
+
+ROUTES = ['paper', 'paper_notes', 'users', 'my_messages', 'message', 'xy_update']
+
+
+class CommandCounter(CommandListener):
+    # 요청을 처리한 스레드별 MongoDB 명령 수
+    def __init__(self):
+        self._local = threading.local()
+
+    @property
+    def count(self):
+        return getattr(self._local, 'count', 0)
+
+    def started(self, event):
+        self._local.count = self.count + 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def load_app(args):
+    # app.py 는 import 할 때 설정을 읽으므로 환경 변수를 먼저 정함
+    os.environ['MONGODB_URI'] = args.uri
+    os.environ['MONGO_DBNAME'] = args.db
+    os.environ.setdefault('SECRET_KEY', 'bench-secret')
+    os.environ.setdefault('SLOW_QUERY_MS', '1000000')  # 측정 중에는 explain 을 실행하지 않도록
+    if args.backend == 'memory':
+        os.environ['REPOSITORY_BACKEND'] = 'memory'
+        # 저장소 밖의 컬렉션용 / 선택 의존성: pip install mongomock
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+        import mongo
+        mongo.MongoClient = mongomock.MongoClient
+    import app as app_module
+    return app_module
+
+
+def seed(app_module, args):
+    # 매번 같은 데이터가 되도록 seed 고정 / 벤치마크 전용 DB 만 지움
+    rng = random.Random(args.seed)
+    db = app_module.db
+    for name in ('users', 'messages', 'counters', 'revision_leases', 'tombstones', 'uploads', 'jobs'):
+        db[name].drop()
+    app_module.ensure_indexes(db)
+    app_module.user_cache.clear()
+    app_module.board_cache.clear()
+    app_module.users_page_cache.clear()
+
+    users = [{
+        'username': f'bench{i}',
+        'password': 'bench',
+        'name': f'사용자{i:06d}',
+        'nickname': f'bench{i}',
+        'profile_picture': None
+    } for i in range(args.users)]
+    if args.backend == 'memory':
+        for user in users:
+            user['_id'] = ObjectId()
+            app_module.user_repository.docs[user['_id']] = user
+    else:
+        for start in range(0, len(users), 1000):
+            db['users'].insert_many(users[start:start + 1000])
+
+    boards = [str(user['_id']) for user in users[:args.boards]]
+    revision = 0
+    for board, owner in zip(boards, users):
+        notes = []
+        for _ in range(args.notes_per_board):
+            revision += 1
+            author = users[rng.randrange(len(users))]
+            notes.append({
+                'content': 'bench note',
+                'recipient_id': board,
+                'recipient_name': owner['name'],
+                'author': author['nickname'],
+                'author_id': author['_id'],
+                'file_url': None,
+                'theme': rng.choice(['yellow', 'green', 'stone']),
+                'newx': rng.randrange(0, 1200),
+                'newy': rng.randrange(0, 20 * args.notes_per_board),
+                'rev': revision
+            })
+        if args.backend == 'memory':
+            for note in notes:
+                app_module.message_repository.insert(app_module.Message.from_doc(note))
+        else:
+            for start in range(0, len(notes), 1000):
+                db['messages'].insert_many(notes[start:start + 1000])
+    db['counters'].update_one({'_id': 'revision'}, {'$set': {'version': revision}}, upsert=True)
+    return users, boards
+
+
+def make_request(client, route, board, note_ids, rng):
+    if route == 'paper':
+        return client.get(f'/paper/{board}')
+    if route == 'paper_notes':
+        return client.get(f'/paper/{board}/notes', query_string={'band': rng.randrange(0, 10)})
+    if route == 'users':
+        return client.get('/users')
+    if route == 'my_messages':
+        return client.get('/my_messages')
+    if route == 'message':
+        return client.post('/message', data={
+            'recipient_id': board, 'content': 'bench', 'theme': 'yellow', 'file': (io.BytesIO(b''), '')
+        }, content_type='multipart/form-data')
+    if route == 'xy_update':
+        return client.post('/xy_update', json={'recipient': board, 'moves': [
+            {'id': rng.choice(note_ids[board]), 'newX': rng.randrange(0, 1200), 'newY': rng.randrange(0, 10000)}
+        ]})
+    raise ValueError(route)
+
+
+def run_route(app_module, route, users, boards, counter, args):
+    latencies, ops, errors = [], [], 0
+    lock = threading.Lock()
+    per_client = max(1, args.requests // args.clients)
+    # 옮길 쪽지 id 는 측정 전에 미리 조회
+    note_ids = {board: [str(message._id) for message in
+                        itertools.islice(app_module.message_repository.for_board(board), 100)]
+                for board in boards} if route == 'xy_update' else {}
+
+    def worker(index):
+        nonlocal errors
+        rng = random.Random(args.seed * 1000 + index)
+        client = app_module.app.test_client()
+        user = users[rng.randrange(len(users))]
+        client.set_cookie('token', app_module.create_jwt_token(user['_id'], app_module.User.from_doc(user)))
+        for _ in range(per_client):
+            board = boards[rng.randrange(len(boards))]
+            before = counter.count
+            start = time.perf_counter()
+            try:
+                response = make_request(client, route, board, note_ids, rng)
+                response.get_data()
+                response.close()
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                ops.append(counter.count - before)
+                errors += failed
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'throughput_rps': len(latencies) / wall,
+        # mongomock 은 명령 이벤트가 없으므로 측정하지 않음
+        'mongo_ops_per_request': sum(ops) / len(ops) if args.backend == 'mongod' else None,
+    }
+
+
+def percentile(sorted_values, p):
+    # nearest-rank 방식
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline, result, threshold):
+    # 기준 파일과 비교해서 route별 변화율 출력 / threshold(%) 이상 느려진 route 목록 반환
+    regressions = []
+    print(f"{'route':14} {'p50':>18} {'p95':>18} {'p99':>18} {'rps':>18}")
+    for route, current in result['routes'].items():
+        old = baseline.get('routes', {}).get(route)
+        if old is None:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps'):
+            change = (current[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            cells.append(f'{old[key]:7.1f}->{current[key]:7.1f} {change:+4.0f}%')
+            slower = change if key != 'throughput_rps' else -change
+            if key == 'p95_ms' and slower > threshold:
+                regressions.append(route)
+        print(f'{route:14} ' + ' '.join(f'{cell:>18}' for cell in cells))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='롤링페이퍼 주요 route 벤치마크')
+    parser.add_argument('--backend', choices=['mongod', 'memory'], default='mongod')
+    parser.add_argument('--uri', default=os.getenv('BENCH_MONGODB_URI', 'mongodb://localhost:27017'))
+    parser.add_argument('--db', default='rollingpaper_bench', help='벤치마크 전용 DB (실행할 때마다 비움)')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--boards', type=int, default=10)
+    parser.add_argument('--notes-per-board', type=int, default=1000)
+    parser.add_argument('--clients', type=int, default=8, help='동시에 요청하는 클라이언트 스레드 수')
+    parser.add_argument('--requests', type=int, default=400, help='route별 요청 수')
+    parser.add_argument('--routes', default=','.join(ROUTES))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-seed', action='store_true', help='이미 만들어 둔 데이터로 실행')
+    parser.add_argument('--output', default='bench_baseline.json')
+    parser.add_argument('--compare', help='비교할 기준 결과 파일')
+    parser.add_argument('--threshold', type=float, default=10.0, help='p95 가 이 비율(%%) 이상 늘면 실패')
+    args = parser.parse_args(argv)
+    if not args.db.endswith('_bench') and not args.no_seed:
+        parser.error('--db 는 실행할 때마다 비워지므로 이름이 _bench 로 끝나야 합니다')
+    if args.backend == 'memory':
+        if args.no_seed:
+            parser.error('--backend memory 는 데이터가 프로세스 안에만 있으므로 --no-seed 를 쓸 수 없습니다')
+        if args.clients != 1:
+            print('--backend memory: mongomock 이 스레드에 안전하지 않으므로 --clients 1 로 실행합니다')
+            args.clients = 1
+
+    app_module = load_app(args)
+    counter = CommandCounter()
+    app_module.mongo.event_listeners.append(counter)  # 처음 연결하기 전에 등록
+
+    if args.no_seed:
+        users = list(app_module.db['users'].find({'username': {'$regex': '^bench'}}))
+        boards = list({message['recipient_id'] for message in app_module.db['messages'].find({}, {'recipient_id': 1})})
+    else:
+        started = time.perf_counter()
+        users, boards = seed(app_module, args)
+        print(f'seeded {len(users)} users, {len(boards)} boards x {args.notes_per_board} notes '
+              f'in {time.perf_counter() - started:.1f}s')
+
+    result = {
+        'meta': {
+            'backend': args.backend,
+            'users': len(users),
+            'boards': len(boards),
+            'notes_per_board': args.notes_per_board,
+            'clients': args.clients,
+            'requests_per_route': args.requests,
+            'seed': args.seed,
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'created': datetime.now(timezone.utc).isoformat(),
+        },
+        'routes': {}
+    }
+    for route in args.routes.split(','):
+        stats = run_route(app_module, route, users, boards, counter, args)
+        result['routes'][route] = stats
+        ops = stats['mongo_ops_per_request']
+        print(f"{route:14} p50 {stats['p50_ms']:7.1f}ms  p95 {stats['p95_ms']:7.1f}ms  p99 {stats['p99_ms']:7.1f}ms  "
+              f"{stats['throughput_rps']:7.1f} req/s  ops/req {'-' if ops is None else f'{ops:.1f}'}  "
+              f"errors {stats['errors']}")
+    app_module.position_buffer.flush()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    print(f'saved {args.output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, result, args.threshold)
+        if regressions:
+            print(f"p95 regressed more than {args.threshold:.0f}%: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
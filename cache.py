@@ -0,0 +1,147 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """크기 제한(LRU)과 유효 시간(TTL)이 있는 프로세스 내 캐시."""
+
+    def __init__(self, maxsize=1024, ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (만료 시각, 값)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)  # 최근에 쓴 항목은 뒤로
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)  # 가장 오래 안 쓴 항목 제거
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+
+class DiskCache:
+    """여러 워커 프로세스가 함께 쓰는 파일 기반 캐시 (TTLCache와 같은 사용법, 값은 pickle로 저장)."""
+
+    def __init__(self, directory, maxsize=10000, ttl=3600.0):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0  # 적중/실패 횟수는 프로세스별 값
+        self.misses = 0
+        self._sets = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        # key는 repr이 프로세스마다 같은 값(문자열, 숫자, 튜플)이어야 함
+        return os.path.join(self.directory, hashlib.sha1(repr(key).encode('utf-8')).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        if expires < time.time():
+            self.invalidate(key)
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((time.time() + self.ttl, value), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)  # 다른 프로세스가 반쯤 쓴 파일을 읽지 않도록
+        self._sets += 1
+        if self._sets % 100 == 0:
+            self._prune()
+
+    def _prune(self):
+        # 파일 수가 maxsize를 넘으면 오래된 것부터 삭제
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.is_file()]
+        except OSError:
+            return
+        if len(entries) <= self.maxsize:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:len(entries) - self.maxsize]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def invalidate(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': sum(1 for _ in os.scandir(self.directory)),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+
+def make_cache(backend, maxsize, ttl, directory=None):
+    # 'memory': 프로세스 내 LRU (기본), 'disk': 워커끼리 공유하는 파일 캐시
+    if backend == 'disk':
+        return DiskCache(directory, maxsize=maxsize, ttl=ttl)
+    return TTLCache(maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,77 @@
+import gzip
+import zlib
+
+from flask import request
+
+# 스트리밍 응답을 압축할 때 이만큼 쌓일 때마다 flush 해서 브라우저로 보냄
+STREAM_FLUSH_SIZE = 8 * 1024
+
+
+def _gzip_stream(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip 헤더
+    pending = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            out = compressor.compress(chunk)
+            pending += len(chunk)
+            if pending >= STREAM_FLUSH_SIZE:
+                out += compressor.flush(zlib.Z_SYNC_FLUSH)
+                pending = 0
+            if out:
+                yield out
+        yield compressor.flush()
+    finally:
+        # 중간에 연결이 끊겨도 원래 스트림(템플릿/커서)을 닫음
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+def gzip_response(response, min_size=1024, level=6):
+    # HTML 응답이 min_size 보다 크면 gzip으로 압축 (스트리밍 응답도 조각 단위로 압축하며 바로 전송)
+    if (response.status_code != 200 or response.content_encoding or response.direct_passthrough
+            or response.mimetype != 'text/html' or 'gzip' not in request.accept_encodings):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    if response.is_streamed:
+        # 앞부분을 min_size 만큼만 먼저 렌더링해서 작은 페이지는 압축하지 않음
+        chunks = iter(response.response)
+        head = []
+        size = 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            head.append(chunk)
+            size += len(chunk)
+            if size >= min_size:
+                break
+        else:
+            response.set_data(b''.join(head))
+            return response
+
+        def rest():
+            try:
+                yield from head
+                yield from chunks
+            finally:
+                close = getattr(chunks, 'close', None)
+                if close is not None:
+                    close()
+
+        response.response = _gzip_stream(rest(), level)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(gzip.compress(data, level))
+
+    response.content_encoding = 'gzip'
+    # 압축된 본문은 원본과 바이트가 다르므로 약한 ETag로 바꿈
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -0,0 +1,123 @@
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from background import BackgroundThread
+
+
+class Subscription:
+    def __init__(self, broker, channel, queue_size):
+        self.broker = broker
+        self.channel = channel
+        self.queue = queue.Queue(queue_size)
+
+    def get(self, timeout):
+        # (event, data) 또는 timeout 동안 아무 것도 없으면 None
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """한 프로세스 안에서만 이벤트를 전달하는 pub/sub (서버 한 대, 워커 하나일 때)."""
+
+    def __init__(self, max_connections=100, queue_size=100):
+        self.max_connections = max_connections  # 워커당 최대 SSE 연결 수
+        self.queue_size = queue_size
+        self._subscriptions = {}  # channel -> set(Subscription)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, channel):
+        # 연결 수 제한을 넘으면 None
+        with self._lock:
+            if self._count >= self.max_connections:
+                return None
+            subscription = Subscription(self, channel, self.queue_size)
+            self._subscriptions.setdefault(channel, set()).add(subscription)
+            self._count += 1
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.channel)
+            if subscriptions and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self._count -= 1
+                if not subscriptions:
+                    del self._subscriptions[subscription.channel]
+
+    def publish(self, channel, event, data):
+        self._deliver(channel, event, data)
+
+    def _deliver(self, channel, event, data):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait((event, data))
+            except queue.Full:
+                pass  # 느린 클라이언트는 이벤트를 놓침 (새로고침하면 최신 상태)
+
+    def connections(self):
+        return self._count
+
+
+class ChangeStreamBroker(InProcessBroker):
+    """여러 서버/워커 사이에 이벤트를 전달하는 pub/sub.
+
+    publish()는 events 컬렉션에 문서를 넣고, 각 프로세스의 감시 스레드가 change stream으로 받아서
+    자기 프로세스의 구독자에게 전달한다. (MongoDB replica set 필요)
+    """
+
+    def __init__(self, collection, max_connections=100, queue_size=100, retention_seconds=600):
+        super().__init__(max_connections, queue_size)
+        self.collection = collection
+        self.retention_seconds = retention_seconds
+        self._thread = BackgroundThread(self._watch, 'event-watch')  # 프로세스마다 감시 스레드 하나
+        self._index_ready = False
+
+    def _ensure_index(self):
+        # 오래된 이벤트 문서는 TTL 인덱스로 자동 삭제
+        if not self._index_ready:
+            self.collection.create_index('created', expireAfterSeconds=self.retention_seconds)
+            self._index_ready = True
+
+    def publish(self, channel, event, data):
+        self._ensure_index()
+        self.collection.insert_one({
+            'channel': channel,
+            'event': event,
+            'data': data,
+            'created': datetime.now(timezone.utc)
+        })
+
+    def subscribe(self, channel):
+        self._thread.ensure()
+        return super().subscribe(channel)
+
+    def _watch(self):
+        resume_token = None
+        while True:
+            try:
+                with self.collection.watch([{'$match': {'operationType': 'insert'}}],
+                                           resume_after=resume_token) as stream:
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        doc = change['fullDocument']
+                        self._deliver(doc['channel'], doc['event'], doc['data'])
+            except OperationFailure as e:
+                # resume token이 너무 오래되었으면 지금부터 다시 감시
+                print(f'event change stream failed: {e}')
+                resume_token = None
+                time.sleep(1)
+            except PyMongoError as e:
+                print(f'event change stream failed: {e}')
+                time.sleep(1)
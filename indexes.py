@@ -0,0 +1,85 @@
+import click
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+# jwt/, UI/ 앱도 쓰는 인덱스 (사용자 조회, 보드 조회, 작성한 쪽지)
+BASIC_INDEXES = {
+    'users': [
+        IndexModel([('username', ASCENDING)], unique=True),  # login(), signup() 아이디 조회 / 중복 방지
+        IndexModel([('name', ASCENDING), ('_id', ASCENDING)]),  # users() 이름순 정렬
+    ],
+    'messages': [
+        IndexModel([('recipient_id', ASCENDING), ('newy', ASCENDING), ('_id', ASCENDING)]),  # paper_notes() 수신자 + (y, _id) 순서 조회
+        IndexModel([('author_id', ASCENDING), ('_id', DESCENDING)]),  # my_messages() 작성자별 최신순, 탈퇴/이름 변경 시 작성한 쪽지
+        IndexModel([('author', ASCENDING), ('_id', DESCENDING)]),  # author_id 가 없는 예전 쪽지 (migrate-snapshots 전)
+    ],
+}
+
+# 메인 앱(app.py)에서 쓰는 인덱스 전체 (앱 시작 시 없는 것만 생성)
+INDEXES = {
+    'users': BASIC_INDEXES['users'] + [
+        IndexModel([('profile_picture', ASCENDING)]),  # gc-uploads 참조 확인
+    ],
+    'messages': BASIC_INDEXES['messages'] + [
+        IndexModel([('recipient_id', ASCENDING), ('rev', ASCENDING)]),  # paper_changes() 보드별 변경 목록
+        IndexModel([('file_url', ASCENDING)]),  # gc-uploads 참조 확인
+    ],
+    'tombstones': [
+        IndexModel([('recipient_id', ASCENDING), ('rev', ASCENDING)]),  # paper_changes() 보드별 삭제 목록
+        IndexModel([('rev', ASCENDING)]),  # compact-tombstones 정리
+    ],
+    'revision_leases': [
+        IndexModel([('at', ASCENDING)], expireAfterSeconds=3600),  # 쓰는 중에 죽은 프로세스가 남긴 기록 정리
+    ],
+}
+
+
+def index_key(model):
+    return tuple(model.document['key'].items())
+
+
+def ensure_indexes(db, indexes=INDEXES):
+    # create_index는 같은 인덱스가 이미 있으면 아무 것도 하지 않으므로 매번 호출해도 안전함
+    created = []
+    for collection_name, models in indexes.items():
+        for model in models:
+            try:
+                created += db[collection_name].create_indexes([model])
+            except OperationFailure as e:
+                # 예) 기존 데이터에 중복 username이 있어서 unique 인덱스를 만들 수 없는 경우
+                print(f'index {collection_name}.{model.document["name"]} not created: {e}')
+    return created
+
+
+def index_report(db, indexes=INDEXES):
+    # 등록된 인덱스마다 (컬렉션, 인덱스 이름, 상태) 반환 / 상태: ok, missing, unused, unknown
+    report = []
+    for collection_name, models in indexes.items():
+        collection = db[collection_name]
+        existing = {tuple(info['key']): name for name, info in collection.index_information().items()}
+
+        # $indexStats는 서버 재시작 이후 인덱스 사용 횟수를 알려줌
+        try:
+            usage = {stat['name']: stat['accesses']['ops'] for stat in collection.aggregate([{'$indexStats': {}}])}
+        except OperationFailure:
+            usage = None
+
+        for model in models:
+            name = existing.get(index_key(model))
+            if name is None:
+                report.append((collection_name, model.document['name'], 'missing'))
+            elif usage is None or name not in usage:
+                report.append((collection_name, name, 'unknown'))
+            elif usage[name] == 0:
+                report.append((collection_name, name, 'unused'))
+            else:
+                report.append((collection_name, name, 'ok'))
+    return report
+
+
+def register_cli(app, db, indexes=INDEXES):
+    # 등록된 인덱스 중 없거나 사용되지 않는 인덱스 확인: flask --app app indexes
+    @app.cli.command('indexes')
+    def indexes_command():
+        for collection_name, name, status in index_report(db, indexes):
+            click.echo(f'{status:8} {collection_name}.{name}')
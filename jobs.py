@@ -0,0 +1,134 @@
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ASCENDING, ReturnDocument
+
+from background import BackgroundThread
+
+
+class LeaseLost(Exception):
+    # 점유 시간이 지나 다른 워커가 작업을 다시 가져감 -> 이 워커는 더 이상 기록하지 않음
+    pass
+
+
+class JobQueue:
+    """MongoDB 컬렉션에 저장되는 작업 큐.
+
+    enqueue() 로 넣은 작업을 워커 스레드가 하나씩 가져가 등록된 함수로 실행한다.
+    실행 중인 작업은 lease_seconds 동안 점유하고, 그 안에 끝나지 않으면(프로세스가 죽은 경우 등)
+    다른 워커가 다시 가져간다. 함수는 checkpoint(progress) 로 진행 상황을 저장할 수 있고,
+    다시 실행될 때 job['progress'] 에서 이어서 진행한다.
+    가져갈 때마다 새 lease 값을 기록하고, 진행 상황/결과는 그 값이 그대로일 때만 저장한다.
+    """
+
+    def __init__(self, collection, workers=1, max_attempts=5, lease_seconds=300, poll_interval=1.0):
+        self.collection = collection
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._handlers = {}
+        self._threads = BackgroundThread(self._run, 'job-worker', count=workers)
+        self._wakeup = threading.Event()
+        self._index_ready = False
+
+    def register(self, job_type, handler):
+        # handler(job, checkpoint) / 예외가 나면 잠시 후 다시 시도
+        self._handlers[job_type] = handler
+
+    def _ensure_index(self):
+        if not self._index_ready:
+            self.collection.create_index([('state', ASCENDING), ('run_at', ASCENDING)])
+            self._index_ready = True
+
+    def enqueue(self, job_type, args):
+        self._ensure_index()
+        now = datetime.now(timezone.utc)
+        result = self.collection.insert_one({
+            'type': job_type,
+            'args': args,
+            'state': 'pending',
+            'attempts': 0,
+            'progress': {},
+            'run_at': now,
+            'created': now,
+            'error': None
+        })
+        self.start()
+        self._wakeup.set()
+        return result.inserted_id
+
+    def start(self):
+        # fork 이후에는 프로세스마다 워커 스레드를 새로 띄움
+        self._threads.ensure()
+
+    def _claim(self):
+        # 대기 중이거나 점유 시간이 지난(실행하던 워커가 죽은) 작업을 하나 가져옴
+        now = datetime.now(timezone.utc)
+        return self.collection.find_one_and_update(
+            {'$or': [
+                {'state': 'pending', 'run_at': {'$lte': now}},
+                {'state': 'running', 'lease_until': {'$lt': now}},
+            ]},
+            {'$set': {'state': 'running', 'lease': uuid.uuid4().hex,
+                      'lease_until': now + timedelta(seconds=self.lease_seconds)},
+             '$inc': {'attempts': 1}},
+            sort=[('run_at', ASCENDING)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    def run_one(self):
+        # 작업 하나를 실행하고 실행했으면 True
+        self._ensure_index()
+        job = self._claim()
+        if job is None:
+            return False
+
+        # 아직 이 워커가 점유 중일 때만 기록
+        mine = {'_id': job['_id'], 'lease': job['lease']}
+
+        def checkpoint(progress):
+            # 진행 상황을 저장하고 점유 시간을 연장
+            job['progress'] = progress
+            result = self.collection.update_one(mine, {'$set': {
+                'progress': progress,
+                'lease_until': datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds)
+            }})
+            if not result.matched_count:
+                raise LeaseLost(f"job {job['_id']} was taken over by another worker")
+
+        try:
+            handler = self._handlers[job['type']]
+            handler(job, checkpoint)
+        except Exception as e:
+            print(f"job {job['_id']} ({job['type']}) failed: {e}")
+            if job['attempts'] >= self.max_attempts:
+                update = {'state': 'failed', 'error': str(e)}
+            else:
+                # 실패할 때마다 다시 시도하는 간격을 늘림
+                delay = min(2 ** job['attempts'], 300)
+                update = {'state': 'pending', 'error': str(e),
+                          'run_at': datetime.now(timezone.utc) + timedelta(seconds=delay)}
+            self.collection.update_one(mine, {'$set': update})
+        else:
+            self.collection.update_one(mine, {'$set': {
+                'state': 'done', 'error': None, 'finished': datetime.now(timezone.utc)
+            }})
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if self.run_one():
+                    continue
+            except Exception as e:
+                print(f'job worker failed: {e}')
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def stats(self):
+        counts = {state: 0 for state in ('pending', 'running', 'done', 'failed')}
+        for row in self.collection.aggregate([{'$group': {'_id': '$state', 'count': {'$sum': 1}}}]):
+            counts[row['_id']] = row['count']
+        return counts
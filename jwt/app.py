@@ -1,21 +1,38 @@
 from flask import Flask, request, jsonify, render_template, redirect, url_for, flash
 from datetime import datetime, timezone, timedelta
-from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 import jwt
 import os
+import sys
 import uuid
 from dotenv import load_dotenv
 from bson import ObjectId  # Import ObjectId
 
+# repository.py, mongo.py, indexes.py 는 저장소 최상위의 공용 모듈을 사용 (메인 앱과 같은 파일)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from indexes import BASIC_INDEXES, ensure_indexes, register_cli as register_index_cli
+from mongo import Mongo, configure as configure_mongo
+from repository import Message, SnapshotMigration, make_repositories, register_cli as register_migration_cli
+
 load_dotenv()
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
 
-client = MongoClient(os.getenv('MONGODB_URI'))
-db = client['user_database'] # 사용할 데이터베이스 이름 설정
-users_collection = db['users']  # 사용자 컬렉션 설정
-messages_collection = db['messages']  # 메시지 컬렉션 설정
+# MongoDB 접속/커넥션 풀 설정 (MONGODB_URI, MONGO_MAX_POOL_SIZE 등) - 처음 사용할 때 프로세스마다 연결
+configure_mongo(app, default_dbname='user_database')
+mongo = Mongo(app)
+db = mongo.db # 사용할 데이터베이스
+
+# 필요한 인덱스 생성 (indexes.py 에 등록된 목록 중 이 앱에서 쓰는 것) - 연결될 때 실행
+@mongo.on_connect
+def ensure_app_indexes(db):
+    return ensure_indexes(db, BASIC_INDEXES)
+
+# 사용자/쪽지 조회와 변경은 repository.py 를 거쳐서 (필요한 필드만 조회해서 User/Message 객체로 반환)
+# 'mongo': users/messages 컬렉션, 'memory': 프로세스 안 dict (테스트/벤치마크용)
+app.config['REPOSITORY_BACKEND'] = os.getenv('REPOSITORY_BACKEND', 'mongo')
+user_repository, message_repository = make_repositories(app.config['REPOSITORY_BACKEND'], db)
 
 def create_jwt_token(user_id):
     payload = {
@@ -44,9 +61,9 @@ def login():
     if request.method == 'POST':
         username = request.form['username'] # 입력된 사용자 이름 가져오기
         password = request.form['password']  # 입력된 비밀번호 가져오기
-        user = users_collection.find_one({'username': username}) # 사용자 이름으로 DB에서 사용자 찾기
-        if user and user['password'] == password: #사용자가 일치하고 비밀번호가 일치하면
-            token = create_jwt_token(user['_id']) #토큰 발급
+        user, stored_password = user_repository.credentials(username) # 사용자 이름으로 DB에서 사용자 찾기
+        if user and stored_password == password: #사용자가 일치하고 비밀번호가 일치하면
+            token = create_jwt_token(user._id) #토큰 발급
             response = jsonify({'token': token}) #json응답 생성
             response.set_cookie('token', token, httponly=True) #쿠키설정
             return response
@@ -64,7 +81,7 @@ def signup():
     if password != confirm_password:
         return jsonify({'message': '비밀번호가 일치하지 않습니다.'}), 400
 
-    if users_collection.find_one({'username': username}):
+    if user_repository.exists(username):
         return jsonify({'message': '이미 존재하는 아이디입니다.'}), 400
 
     profile_pic = request.files.get('profile_pic')  # 업로드된 프로필 사진 파일 가져오기
@@ -76,13 +93,10 @@ def signup():
         profile_pic.save(profile_pic_path)
         profile_pic_filename = f"uploads/{filename}"
 
-    users_collection.insert_one({
-        'username': username,
-        'password': password,
-        'name': name,
-        'nickname': nickname,
-        'profile_picture': profile_pic_filename  # 프로필 사진 경로 저장
-    })
+    try:
+        user_repository.create(username, password, name, nickname, profile_pic_filename)  # 프로필 사진 경로 저장
+    except DuplicateKeyError:  # 동시에 같은 아이디로 가입한 경우 (username unique 인덱스)
+        return jsonify({'message': '이미 존재하는 아이디입니다.'}), 400
 
     return redirect(url_for('login'))
 
@@ -93,9 +107,9 @@ def users():
         try:
             payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
             user_id = ObjectId(payload['user_id'])  # 'user_id'를 ObjectId로 변환
-            user = users_collection.find_one({'_id': user_id})  # MongoDB에서 사용자 검색
+            user = user_repository.get(user_id)  # MongoDB에서 사용자 검색
             if user:
-                users = users_collection.find().sort('name', 1)  # 1은 오름차 -1은 내림차 DB에서 모든 사용자 가져오기
+                users = user_repository.by_name()  # 이름 오름차순으로 모든 사용자 가져오기
                 return render_template('users.html', users=users) # 유저 목록 페이지 렌더링
             else:
                 return 'User not found', 404
@@ -113,20 +127,20 @@ def paper(user_id):
 
             payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
             my_id = ObjectId(payload['user_id'])  # 'user_id'를 ObjectId로 변환
-            my = users_collection.find_one({'_id': my_id})  # MongoDB에서 사용자 검색
+            my = user_repository.get(my_id)  # MongoDB에서 사용자 검색
 
-            recipient = users_collection.find_one({'_id': ObjectId(user_id)})
+            recipient = user_repository.get(ObjectId(user_id))
             if not recipient:
                 return "User not found", 404
             
-            messages = messages_collection.find({'recipient_id': user_id})
+            messages = message_repository.for_board(user_id)
 
             messages_with_file_url = []
             for message in messages:
-                file_url = message.get('file_url')
+                file_url = message.file_url
                 if file_url:
                     file_extension = file_url.rsplit('.', 1)[1].lower()
-                    message['file_url'] = url_for('static', filename=file_url)
+                    message.file_url = url_for('static', filename=file_url)
                 messages_with_file_url.append(message)
 
             return render_template('paper.html', messages=messages_with_file_url, recipient=recipient, my=my) # 유저 목록 페이지 렌더링
@@ -143,12 +157,12 @@ def message():
         try:
             payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
             user_id = ObjectId(payload['user_id'])
-            user = users_collection.find_one({'_id': user_id})
+            user = user_repository.get(user_id)
 
             recipient_id = request.form["recipient_id"]
             content = request.form["content"]
-            author = user['nickname']
             theme = request.form["theme"]
+            recipient = user_repository.get(ObjectId(recipient_id)) if ObjectId.is_valid(recipient_id) else None
 
             file = request.files['file']
             file_url = None
@@ -158,13 +172,15 @@ def message():
                 file.save(file_path)
                 file_url = f"uploads/{filename}"
 
-            messages_collection.insert_one({
-                "content": content,
-                "recipient_id": recipient_id,
-                'author': author,
-                'file_url': file_url,
-                "theme": theme
-            })
+            message_repository.insert(Message(
+                content=content,
+                recipient_id=recipient_id,
+                recipient_name=recipient.name if recipient else None,  # 이름 사본 (my_messages 에서 users 조회 없이 표시)
+                author=user.nickname,
+                author_id=user._id,
+                file_url=file_url,
+                theme=theme
+            ))
 
             return redirect(url_for('paper', user_id=recipient_id))
         except jwt.ExpiredSignatureError:
@@ -183,14 +199,9 @@ def update_data():
             new_x = data.get("newX")  # JSON에서 X 좌표 값 추출
             new_y = data.get("newY")  # JSON에서 Y 좌표 값 추출
             recipient_id = data.get("recipient")
-            
-            # MongoDB에서 documents의 'messages' 컬렉션을 선택
-            collection = messages_collection
-            
-            # 'id'가 주어진 item_id와 일치하는 문서를 찾고, 'newx'와 'newy' 필드를 업데이트
-            collection.update_one(
-                {"_id": ObjectId(id)}, {"$set": {"newx": new_x, "newy": new_y}}
-            )
+
+            # 'id'가 주어진 item_id와 일치하는 쪽지의 'newx'와 'newy' 필드를 업데이트
+            message_repository.move(ObjectId(id), new_x, new_y)
             
             return redirect(url_for('paper', user_id=recipient_id))
         except jwt.ExpiredSignatureError:
@@ -206,39 +217,11 @@ def my_messages():
         try:
             payload = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
             user_id = ObjectId(payload['user_id'])
-            user = users_collection.find_one({'_id': user_id})
-            # 현재 사용자의 닉네임을 가져옵니다.
-            nickname = user['nickname']
+            user = user_repository.get(user_id)
 
-            # 현재 사용자가 작성한 모든 쪽지를 가져옵니다.
-            messages = list(messages_collection.find({'author': nickname}))
-
-            
+            # 현재 사용자가 작성한 모든 쪽지를 받은 사람 이름과 함께 가져옵니다.
+            final_result = message_repository.authored_by(user._id, nickname=user.nickname)
 
-            # 가져온 쪽지의 recipient_id 리스트를 만듭니다.
-            recipient_ids = [message['recipient_id'] for message in messages]
-            print(recipient_ids)
-
-            recipient_ids = [ObjectId(id_str) for id_str in recipient_ids]
-
-            # 해당 쪽지를 받은 유저의 이름을 가져옵니다. (recipient_id를 가진 유저 name을 조회)
-            ToUsers = users_collection.find({'_id': {'$in': recipient_ids}}, {'_id': 1, 'name': 1})
-            ToUsers_dict = {str(user['_id']): user.get('name', 'No Name') for user in ToUsers}
-
-            # 메시지와 수신자의 이름을 결합합니다.
-            final_result = []
-            for message in messages:
-                recipient_id = str(message['recipient_id'])
-                ToName = ToUsers_dict.get(recipient_id, "Name not found")
-                final_result.append({
-                    '_id' : message['_id'],
-                    'content': message['content'],
-                    'file_url': message.get('file_url'),
-                    'author': message['author'],
-                    'theme' : message['theme'],
-                    'ToName': ToName
-                })
-            
             return render_template('my_messages.html', messages=final_result)
         except jwt.ExpiredSignatureError:
             return 'Token has expired', 401 # 토큰 만료 처리
@@ -251,20 +234,20 @@ def delete_message(message_id, recipient_id):
     token = request.cookies.get('token')
     if token:
         try:       
-            message = messages_collection.find_one({'_id': ObjectId(message_id)})
+            message = message_repository.get(ObjectId(message_id))
             if not message:
                 jsonify({'message': '메모를 찾을 수 없습니다.'}), 401
             recipient = recipient_id
 
                 # 파일 경로가 존재하면 파일을 삭제합니다.
-            file_url = message.get('file_url')
+            file_url = message.file_url
             if file_url:
                 file_path = os.path.join(app.config['UPLOAD_FOLDER'], os.path.basename(file_url))
                 if os.path.exists(file_path):
                     os.remove(file_path)
                 
             # 메모를 삭제합니다.
-            messages_collection.delete_one({'_id': ObjectId(message_id)})
+            message_repository.delete(message._id)
             return redirect(url_for('paper', user_id=recipient))
         except jwt.ExpiredSignatureError:
             return 'Token has expired', 401 # 토큰 만료 처리
@@ -277,19 +260,19 @@ def delete_my_message(message_id):
     token = request.cookies.get('token')
     if token:
         try:       
-            message = messages_collection.find_one({'_id': ObjectId(message_id)})
+            message = message_repository.get(ObjectId(message_id))
             if not message:
                 jsonify({'message': '메모를 찾을 수 없습니다.'}), 401
 
                 # 파일 경로가 존재하면 파일을 삭제합니다.
-            file_url = message.get('file_url')
+            file_url = message.file_url
             if file_url:
                 file_path = os.path.join(app.config['UPLOAD_FOLDER'], os.path.basename(file_url))
                 if os.path.exists(file_path):
                     os.remove(file_path)
                 
             # 메모를 삭제합니다.
-            messages_collection.delete_one({'_id': ObjectId(message_id)})
+            message_repository.delete(message._id)
             return redirect(url_for('my_messages'))
         except jwt.ExpiredSignatureError:
             return 'Token has expired', 401 # 토큰 만료 처리
@@ -308,5 +291,17 @@ def logout():
     response.set_cookie('token', '', httponly=True, max_age=0)
     return response
 
+@app.route('/pool_stats')
+def pool_stats():
+    # MongoDB 커넥션 풀 사용량 (프로세스별 값) / 대기(waits)나 timeouts가 늘면 풀 크기나 워커 수 조정
+    return jsonify(mongo.stats())
+
+# 등록된 인덱스 중 없거나 사용되지 않는 인덱스 확인 (flask --app app indexes)
+register_index_cli(app, db, BASIC_INDEXES)
+
+# 예전 쪽지에 author_id / 받는 사람 이름 사본 채우기 (flask --app app migrate-snapshots)
+snapshot_migration = SnapshotMigration(message_repository, db['counters'])
+register_migration_cli(app, snapshot_migration)
+
 if __name__ == '__main__':
     app.run(debug=True)
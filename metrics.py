@@ -0,0 +1,224 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import before_render_template, request, request_started, template_rendered
+from pymongo.monitoring import CommandListener
+from werkzeug.wsgi import ClosingIterator
+
+# 응답 시간 구간(초) - Prometheus histogram bucket
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# SSE 연결 유지 시간(초) - 몇 초에서 몇 시간까지
+STREAM_BUCKETS = (1, 5, 15, 60, 300, 900, 1800, 3600, 7200)
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._values = {}  # label 값 튜플 -> [bucket별 개수..., +Inf 개수, 합계]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(label_values)
+            if values is None:
+                values = self._values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            values[index] += 1
+            values[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            items = sorted((key, list(values)) for key, values in self._values.items())
+        for label_values, values in items:
+            labels = _format_labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            cumulative += values[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {values[-1]}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            lines.append(f'{self.name}{{{_format_labels(self.labels, label_values)}}} {value}')
+        return lines
+
+
+def _format_labels(names, values):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _RequestTimings:
+    __slots__ = ('route', 'db', 'db_commands', 'template', 'upload', 'template_starts')
+
+    def __init__(self):
+        self.route = None
+        self.db = 0.0
+        self.db_commands = {}  # 명령 이름 -> 횟수
+        self.template = 0.0
+        self.upload = 0.0
+        self.template_starts = []  # (시작 시각, 그때까지의 DB 시간)
+
+
+class _CommandTimer(CommandListener):
+    # pymongo는 요청을 처리하는 스레드에서 이벤트를 보내므로 그 스레드의 요청에 DB 시간을 더함
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.metrics._add_db(event.command_name, event.duration_micros)
+
+    def failed(self, event):
+        self.metrics._add_db(event.command_name, event.duration_micros)
+
+
+class RequestMetrics:
+    """요청마다 전체 시간과 그중 DB / 템플릿 렌더링 / 업로드 I/O 에 쓴 시간을 route별 histogram으로 모음.
+
+    WSGI 미들웨어로 스트리밍 응답이 끝날 때까지 측정하고, 값은 프로세스별로 /metrics 에서 Prometheus 형식으로 내보낸다.
+    SSE(text/event-stream) 응답은 연결이 끊길 때까지 열려 있으므로 요청 시간 대신 연결 유지 시간으로 따로 모은다.
+    """
+
+    def __init__(self, app=None):
+        self._local = threading.local()
+        self.command_listener = _CommandTimer(self)
+        self.requests = Histogram('http_request_duration_seconds', '요청 처리 시간 (스트리밍 응답 포함)',
+                                  ('route', 'method', 'status'))
+        self.phases = Histogram('http_request_phase_seconds', '요청 중 DB/템플릿/업로드 I/O에 쓴 시간',
+                                ('route', 'phase'))
+        self.streams = Histogram('http_stream_duration_seconds', 'SSE 연결 유지 시간', ('route', 'status'),
+                                 buckets=STREAM_BUCKETS)
+        self.db_commands = Counter('mongo_commands_total', '요청 중 실행한 MongoDB 명령 수', ('route', 'command'))
+        self.db_commands_per_request = Histogram('mongo_commands_per_request', '요청 한 번에 실행한 MongoDB 명령 수',
+                                                 ('route',), buckets=(1, 2, 5, 10, 20, 50, 100))
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.wsgi_app = self._middleware(app.wsgi_app)
+        request_started.connect(self._request_started, app)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._rendered, app)
+        app.extensions['request_metrics'] = self
+
+    def _current(self):
+        return getattr(self._local, 'current', None)
+
+    def _middleware(self, wsgi_app):
+        def middleware(environ, start_response):
+            timings = _RequestTimings()
+            self._local.current = timings
+            start = time.perf_counter()
+            status = []
+            stream = []
+
+            def capture_status(status_line, headers, exc_info=None):
+                status[:] = [status_line.split(' ', 1)[0]]
+                stream[:] = [any(name.lower() == 'content-type' and value.lower().startswith('text/event-stream')
+                                 for name, value in headers)]
+                return start_response(status_line, headers, exc_info)
+
+            def finish():
+                if self._current() is timings:
+                    self._local.current = None
+                self._record(timings, environ.get('REQUEST_METHOD', ''), status[0] if status else '500',
+                             time.perf_counter() - start, stream=bool(stream and stream[0]))
+
+            try:
+                response = wsgi_app(environ, capture_status)
+            except Exception:
+                finish()
+                raise
+            return ClosingIterator(response, [finish])
+        return middleware
+
+    def _request_started(self, sender, **extra):
+        timings = self._current()
+        if timings is not None:
+            # 요청한 주소가 아니라 route 패턴으로 묶음 (라벨 수가 늘어나지 않도록)
+            timings.route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+    def _before_render(self, sender, template, context, **extra):
+        timings = self._current()
+        if timings is not None:
+            timings.template_starts.append((time.perf_counter(), timings.db))
+
+    def _rendered(self, sender, template, context, **extra):
+        timings = self._current()
+        if timings is not None and timings.template_starts:
+            started, db_before = timings.template_starts.pop()
+            # 스트리밍 렌더링 중 커서를 읽는 시간은 DB 쪽으로 계산
+            timings.template += (time.perf_counter() - started) - (timings.db - db_before)
+
+    def _add_db(self, command_name, duration_micros):
+        timings = self._current()
+        if timings is not None:
+            timings.db += duration_micros / 1e6
+            timings.db_commands[command_name] = timings.db_commands.get(command_name, 0) + 1
+
+    @contextmanager
+    def track_upload(self):
+        # 업로드 파일을 받고 저장하는 시간
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings = self._current()
+            if timings is not None:
+                timings.upload += time.perf_counter() - start
+
+    def _record(self, timings, method, status, elapsed, stream=False):
+        route = timings.route or 'unmatched'
+        for command_name, count in timings.db_commands.items():
+            self.db_commands.inc((route, command_name), count)
+        if stream:
+            # 연결 시간이 요청 시간 분포를 망가뜨리지 않도록 요청/단계별 histogram 에는 넣지 않음
+            self.streams.observe((route, status), elapsed)
+            return
+        self.requests.observe((route, method, status), elapsed)
+        self.phases.observe((route, 'db'), timings.db)
+        self.phases.observe((route, 'template'), max(timings.template, 0.0))
+        if timings.upload:
+            self.phases.observe((route, 'upload'), timings.upload)
+        self.db_commands_per_request.observe((route,), sum(timings.db_commands.values()))
+
+    def render(self, gauges=()):
+        # gauges: [(이름, 설명, 값), ...] (커넥션 풀 사용량 등)
+        lines = []
+        for metric in (self.requests, self.phases, self.streams, self.db_commands, self.db_commands_per_request):
+            lines += metric.render()
+        for name, help, value in gauges:
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,200 @@
+import os
+import threading
+import time
+
+from pymongo import MongoClient
+from pymongo.monitoring import ConnectionCheckOutFailedReason, ConnectionPoolListener
+
+
+class PoolMetrics(ConnectionPoolListener):
+    """커넥션 풀 이벤트를 세어서 워커 수/풀 크기를 정할 때 참고하는 값 (프로세스별)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()  # 체크아웃 시작 시각 (같은 스레드에서 이벤트가 옴)
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connections = 0  # 열려 있는 커넥션 수
+            self.in_use = 0  # 지금 체크아웃된 커넥션 수
+            self.max_in_use = 0
+            self.checkouts = 0
+            self.waits = 0  # 1ms 이상 기다려서 받은 횟수
+            self.wait_ms_total = 0.0
+            self.wait_ms_max = 0.0
+            self.timeouts = 0  # waitQueueTimeoutMS 안에 커넥션을 받지 못한 횟수
+            self.failures = 0  # 그 외 체크아웃 실패 (연결 오류 등)
+            self.cleared = 0  # 서버 오류로 풀이 비워진 횟수
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.cleared += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections -= 1
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            if event.reason == ConnectionCheckOutFailedReason.TIMEOUT:
+                self.timeouts += 1
+            else:
+                self.failures += 1
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, 'started', None)
+        wait_ms = (time.perf_counter() - started) * 1000 if started is not None else 0.0
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            if wait_ms >= 1:
+                self.waits += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'connections': self.connections,
+                'in_use': self.in_use,
+                'max_in_use': self.max_in_use,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'wait_ms_avg': self.wait_ms_total / self.checkouts if self.checkouts else 0.0,
+                'wait_ms_max': self.wait_ms_max,
+                'timeouts': self.timeouts,
+                'failures': self.failures,
+                'cleared': self.cleared,
+            }
+
+
+class LazyCollection:
+    """처음 사용할 때(그리고 fork 이후 프로세스마다) 연결되는 컬렉션. 나머지는 pymongo Collection과 같음."""
+
+    def __init__(self, mongo, name):
+        self._mongo = mongo
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._mongo.get_database()[self._name], attr)
+
+    def __getitem__(self, name):
+        return self._mongo.get_database()[self._name][name]
+
+
+class LazyDatabase:
+    def __init__(self, mongo):
+        self._mongo = mongo
+
+    def __getitem__(self, name):
+        return LazyCollection(self._mongo, name)
+
+    def __getattr__(self, attr):
+        return getattr(self._mongo.get_database(), attr)
+
+
+class Mongo:
+    """앱 설정으로 MongoClient를 만들고 관리.
+
+    import 시점이 아니라 처음 DB를 쓸 때 연결하고, pre-fork 서버(gunicorn 등)에서 fork된
+    프로세스는 부모의 클라이언트를 쓰지 않고 새로 연결한다.
+    """
+
+    def __init__(self, app=None, event_listeners=()):
+        self.metrics = PoolMetrics()
+        self.event_listeners = list(event_listeners)  # 추가로 등록할 pymongo 이벤트 리스너 (명령 시간 측정 등)
+        self.db = LazyDatabase(self)
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._on_connect = []
+        self.uri = None
+        self.dbname = None
+        self.options = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.uri = config['MONGO_URI']
+        self.dbname = config['MONGO_DBNAME']
+        self.options = {
+            'maxPoolSize': config['MONGO_MAX_POOL_SIZE'],
+            'minPoolSize': config['MONGO_MIN_POOL_SIZE'],
+            'waitQueueTimeoutMS': config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+            'serverSelectionTimeoutMS': config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+            'connectTimeoutMS': config['MONGO_CONNECT_TIMEOUT_MS'],
+        }
+        app.extensions['mongo'] = self
+
+    def on_connect(self, callback):
+        # 프로세스마다 처음 연결한 뒤 callback(db) 실행 (인덱스 생성 등)
+        self._on_connect.append(callback)
+        return callback
+
+    @property
+    def client(self):
+        client = self._client
+        if client is not None and self._pid == os.getpid():
+            return client
+        with self._lock:
+            if self._client is None or self._pid != os.getpid():
+                # fork 이후라면 부모의 클라이언트(와 metrics 값)는 버리고 새로 만듦
+                self.metrics.reset()
+                self._client = MongoClient(self.uri, event_listeners=[self.metrics, *self.event_listeners], **self.options)
+                self._pid = os.getpid()
+                database = self._client[self.dbname]
+                for callback in self._on_connect:
+                    try:
+                        callback(database)
+                    except Exception as e:
+                        print(f'mongo on_connect {callback.__name__} failed: {e}')
+            return self._client
+
+    def get_database(self):
+        return self.client[self.dbname]
+
+    def stats(self):
+        stats = self.metrics.stats()
+        stats['max_pool_size'] = self.options.get('maxPoolSize')
+        stats['min_pool_size'] = self.options.get('minPoolSize')
+        return stats
+
+
+def configure(app, default_uri=None, default_dbname='user_database'):
+    # 환경 변수에서 접속/풀 설정을 읽어 app.config에 넣음 (값이 없으면 pymongo 기본값 대신 아래 값 사용)
+    # 접속 주소에는 계정 정보가 들어가므로 코드에 두지 않음 -> MONGODB_URI(.env)가 없으면 바로 실패
+    app.config['MONGO_URI'] = os.getenv('MONGODB_URI', default_uri)
+    if not app.config['MONGO_URI']:
+        raise RuntimeError('MONGODB_URI 환경 변수(.env)에 MongoDB 접속 주소를 설정해야 합니다.')
+    app.config['MONGO_DBNAME'] = os.getenv('MONGO_DBNAME', default_dbname)
+    app.config['MONGO_MAX_POOL_SIZE'] = int(os.getenv('MONGO_MAX_POOL_SIZE', 50))  # 워커 프로세스당 최대 커넥션
+    app.config['MONGO_MIN_POOL_SIZE'] = int(os.getenv('MONGO_MIN_POOL_SIZE', 0))
+    app.config['MONGO_WAIT_QUEUE_TIMEOUT_MS'] = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000))  # 풀이 다 차면 기다리는 최대 시간
+    app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'] = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    app.config['MONGO_CONNECT_TIMEOUT_MS'] = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000))
@@ -0,0 +1,94 @@
+import atexit
+import threading
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.write_concern import WriteConcern
+
+from background import BackgroundThread
+
+
+def parse_write_concern(value):
+    # 'majority' 같은 문자열은 그대로, 숫자는 int로 ("1", "0" 등)
+    value = str(value).strip()
+    return WriteConcern(w=int(value) if value.isdigit() else value)
+
+
+class PositionWriteBuffer:
+    """쪽지 좌표 변경을 모아 두었다가 한 번의 bulk write로 저장하는 버퍼.
+
+    같은 쪽지를 여러 번 옮기면 마지막 좌표만 남는다.
+    batch_size 만큼 쌓이거나 flush_interval(초)이 지나면 저장한다.
+    flush_interval 이 0 이하이면 버퍼 없이 바로 저장한다.
+    revision 이 있으면 with revision(n) as first: 로 받은 번호부터 쪽지마다 하나씩 rev 필드에 기록한다.
+    (RevisionCounter.allocate - 저장이 끝날 때까지 번호를 '쓰는 중'으로 표시)
+    저장은 messages.save_positions() (repository.py) 로 한다.
+    """
+
+    def __init__(self, messages, batch_size=100, flush_interval=1.0, write_concern=None, on_flush=None,
+                 revision=None):
+        self.messages = messages
+        self.on_flush = on_flush  # 저장이 끝난 뒤 저장한 쪽지 id 목록으로 호출
+        self.revision = revision
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.write_concern = write_concern
+        self._pending = {}  # 쪽지 id -> (x, y)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = BackgroundThread(self._run, 'position-flush')
+        atexit.register(self.flush)
+
+    def add(self, moves):
+        # moves: [(id, x, y), ...] / 잘못된 id는 건너뜀
+        with self._lock:
+            for note_id, x, y in moves:
+                try:
+                    self._pending[ObjectId(note_id)] = (x, y)
+                except (InvalidId, TypeError):
+                    continue
+            full = len(self._pending) >= self.batch_size
+
+        if full or self.flush_interval <= 0:
+            self.flush()
+        else:
+            self._thread.ensure()
+
+    def flush(self):
+        # 한 번에 하나의 flush만 실행 (순서가 뒤바뀌어 예전 좌표로 덮어쓰지 않도록)
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            updates = [{'newx': x, 'newy': y} for x, y in pending.values()]
+            try:
+                if self.revision is None:
+                    self.messages.save_positions(dict(zip(pending, updates)), write_concern=self.write_concern)
+                else:
+                    with self.revision(len(updates)) as first:
+                        # 쪽지마다 서로 다른 revision (변경 목록을 중간에서 끊어 받아도 빠지는 쪽지가 없도록)
+                        for i, update in enumerate(updates):
+                            update['rev'] = first + i
+                        self.messages.save_positions(dict(zip(pending, updates)), write_concern=self.write_concern)
+            except Exception:
+                # 실패하면 다시 넣어 둠 (그 사이 새로 들어온 좌표가 있으면 그쪽을 유지)
+                with self._lock:
+                    for note_id, xy in pending.items():
+                        self._pending.setdefault(note_id, xy)
+                raise
+            if self.on_flush is not None:
+                try:
+                    self.on_flush(list(pending))
+                except Exception as e:
+                    print(f'position on_flush failed: {e}')
+            return len(updates)
+
+    def _run(self):
+        stop = threading.Event()
+        while not stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                print(f'position flush failed: {e}')
@@ -0,0 +1,209 @@
+import cProfile
+import hmac
+import marshal
+import os
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from flask import g, request
+
+from background import BackgroundThread
+
+
+def _route_tag(route):
+    # 파일 이름에 넣을 수 있도록 '/paper/<user_id>' -> 'paper_user_id'
+    return re.sub(r'[^A-Za-z0-9]+', '_', route or 'unmatched').strip('_') or 'root'
+
+
+class ProfileStore:
+    """프로파일 결과를 pstats 형식 파일로 저장하고 최근 keep 개만 남기는 폴더."""
+
+    def __init__(self, directory, keep=200):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def write(self, kind, route, stats, user_id=None, duration_ms=None):
+        # 파일 이름에 종류/route/사용자/걸린 시간을 태그로 남김: pstats.Stats(path) 나 snakeviz 로 열 수 있음
+        os.makedirs(self.directory, exist_ok=True)
+        tags = [datetime.now().strftime('%Y%m%d-%H%M%S-%f'), kind, _route_tag(route),
+                f'user-{user_id}' if user_id else None, f'{duration_ms:.0f}ms' if duration_ms is not None else None,
+                f'pid{os.getpid()}']
+        path = os.path.join(self.directory, '-'.join(tag for tag in tags if tag) + '.prof')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            marshal.dump(stats, f)
+        os.replace(tmp_path, path)
+        self._rotate()
+        return path
+
+    def _rotate(self):
+        with self._lock:
+            try:
+                entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith('.prof')]
+            except FileNotFoundError:
+                return
+            if len(entries) <= self.keep:
+                return
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:len(entries) - self.keep]:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+class StackSampler:
+    """요청을 처리 중인 스레드의 스택을 주기적으로 샘플링해서 route별 pstats 파일로 저장.
+
+    hz 번/초 sys._current_frames() 를 읽기만 하므로 서비스 전체에서 켜 두어도 부담이 작다.
+    window 초마다 모은 샘플을 파일로 쓴다.
+    """
+
+    def __init__(self, store, hz=0, window=60):
+        self.store = store
+        self.hz = hz
+        self.window = window
+        self.active = {}  # 스레드 id -> route (요청 처리 중인 스레드만)
+        self._samples = defaultdict(lambda: defaultdict(int))  # route -> 스택(튜플) -> 횟수
+        self._lock = threading.Lock()
+        self._thread = BackgroundThread(self._run, 'stack-sampler')
+
+    def enter(self, route):
+        if self.hz > 0:
+            self.active[threading.get_ident()] = route
+            self._thread.ensure()
+
+    def leave(self):
+        self.active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        interval = 1.0 / self.hz
+        flush_at = time.monotonic() + self.window
+        while True:
+            time.sleep(interval)
+            self.sample()
+            if time.monotonic() >= flush_at:
+                flush_at = time.monotonic() + self.window
+                try:
+                    self.flush()
+                except OSError as e:
+                    print(f'stack sampler flush failed: {e}')
+
+    def sample(self):
+        frames = sys._current_frames()
+        for thread_id, route in list(self.active.items()):
+            frame = frames.get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                with self._lock:
+                    self._samples[route][tuple(reversed(stack))] += 1  # 바깥 함수부터
+
+    def flush(self):
+        with self._lock:
+            samples, self._samples = self._samples, defaultdict(lambda: defaultdict(int))
+        interval = 1.0 / self.hz
+        for route, stacks in samples.items():
+            self.store.write('sample', route, samples_to_stats(stacks, interval),
+                             duration_ms=sum(stacks.values()) * interval * 1000)
+
+
+def samples_to_stats(stacks, interval):
+    # 샘플 수 x 간격을 시간으로 해서 cProfile 과 같은 pstats 딕셔너리로 변환
+    # {함수: (primitive calls, calls, 자체 시간, 누적 시간, {호출한 함수: (calls, primitive calls, 자체 시간, 누적 시간)})}
+    stats = {}
+    for stack, count in stacks.items():
+        elapsed = count * interval
+        seen = set()
+        for depth, func in enumerate(stack):
+            cc, nc, tt, ct, callers = stats.get(func, (0, 0, 0.0, 0.0, {}))
+            if depth == len(stack) - 1:
+                tt += elapsed  # 맨 안쪽 함수가 실제로 실행 중
+            if func not in seen:  # 재귀 호출은 누적 시간을 한 번만
+                ct += elapsed
+                seen.add(func)
+            nc += count
+            cc += count
+            if depth > 0:
+                caller = stack[depth - 1]
+                c_nc, c_cc, c_tt, c_ct = callers.get(caller, (0, 0, 0.0, 0.0))
+                callers[caller] = (c_nc + count, c_cc + count,
+                                   c_tt + (elapsed if depth == len(stack) - 1 else 0.0), c_ct + elapsed)
+            stats[func] = (cc, nc, tt, ct, callers)
+    return stats
+
+
+class RequestProfiler:
+    """관리자가 헤더(X-Profile) 나 쿠키(profile)를 보내면 그 요청 하나를 cProfile 로 프로파일링.
+
+    스트리밍 응답도 전송이 끝날 때까지 측정하고, 결과는 route/사용자/걸린 시간 태그와 함께 저장한다.
+    identify() 는 현재 요청의 사용자 id (로그인하지 않았으면 None) 를 반환해야 한다.
+    """
+
+    def __init__(self, app=None, identify=None, store=None, sampler=None, admins=(), secret=None):
+        self.identify = identify
+        self.store = store
+        self.sampler = sampler
+        self.admins = set(admins)  # 프로파일링을 요청할 수 있는 사용자 id
+        self.secret = secret  # 설정하면 헤더/쿠키 값이 이 값과 같아야 함
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions['request_profiler'] = self
+
+    def _requested(self):
+        flag = request.headers.get('X-Profile') or request.cookies.get('profile')
+        if not flag or not self.admins:
+            return None
+        if self.secret and not hmac.compare_digest(flag, self.secret):
+            return None
+        user_id = self.identify() if self.identify else None
+        return user_id if user_id in self.admins else None
+
+    def _before_request(self):
+        route = request.url_rule.rule if request.url_rule is not None else None
+        if self.sampler is not None:
+            self.sampler.enter(route)
+        user_id = self._requested()
+        if user_id is not None:
+            profile = cProfile.Profile()
+            g._profile = (profile, route, user_id, time.perf_counter())
+            profile.enable()
+
+    def _after_request(self, response):
+        current = g.pop('_profile', None)
+        if current is not None:
+            # 스트리밍 응답은 다 보낸 뒤에 끝냄 (그때는 요청 컨텍스트가 없으므로 값을 넘겨 둠)
+            response.call_on_close(lambda: self._finish(current))
+        return response
+
+    def _teardown_request(self, exc):
+        # 예외로 after_request 가 실행되지 않아도 항상 호출됨 (스트리밍 응답은 컨텍스트가 닫힐 때)
+        if self.sampler is not None:
+            self.sampler.leave()
+        # after_request 까지 가지 못한 경우
+        current = g.pop('_profile', None)
+        if current is not None:
+            self._finish(current)
+
+    def _finish(self, current):
+        profile, route, user_id, started = current
+        profile.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+        profile.create_stats()
+        try:
+            self.store.write('request', route, profile.stats, user_id=user_id, duration_ms=duration_ms)
+        except OSError as e:
+            print(f'request profile write failed: {e}')
@@ -0,0 +1,746 @@
+import threading
+import time
+
+import click
+from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+
+class User:
+    """users 문서 중 화면/토큰에 쓰는 필드만 담는 객체 (비밀번호는 담지 않음)."""
+
+    __slots__ = ('_id', 'username', 'name', 'nickname', 'profile_picture', 'token_version')
+
+    def __init__(self, _id=None, username=None, name=None, nickname=None, profile_picture=None, token_version=0):
+        self._id = _id
+        self.username = username
+        self.name = name
+        self.nickname = nickname
+        self.profile_picture = profile_picture
+        self.token_version = token_version
+
+    @classmethod
+    def from_doc(cls, doc):
+        return cls(**{field: doc[field] for field in cls.__slots__ if field in doc})
+
+    def __repr__(self):
+        return f'User({self._id}, {self.nickname!r})'
+
+
+class Message:
+    """쪽지 문서.
+
+    author(작성자 닉네임)와 recipient_name(받는 사람 이름)은 쓸 때 저장해 두는 사본이라 조회할 때 users 를
+    다시 읽지 않는다. 이름이 바뀌면 sync_author() / sync_recipient() 로 맞춘다.
+    """
+
+    __slots__ = ('_id', 'content', 'recipient_id', 'recipient_name', 'author', 'author_id', 'file_url', 'theme',
+                 'newx', 'newy', 'rev')
+    STORED = __slots__[1:]  # DB에 저장하는 필드 (_id 제외)
+
+    def __init__(self, _id=None, content=None, recipient_id=None, recipient_name=None, author=None, author_id=None,
+                 file_url=None, theme=None, newx=None, newy=None, rev=None):
+        self._id = _id
+        self.content = content
+        self.recipient_id = recipient_id
+        self.recipient_name = recipient_name
+        self.author = author
+        self.author_id = author_id
+        self.file_url = file_url
+        self.theme = theme
+        self.newx = newx
+        self.newy = newy
+        self.rev = rev
+
+    @classmethod
+    def from_doc(cls, doc):
+        return cls(**{field: doc[field] for field in cls.__slots__ if field in doc})
+
+    def to_doc(self):
+        # 값이 없는 필드는 저장하지 않음
+        return {field: getattr(self, field) for field in self.STORED if getattr(self, field) is not None}
+
+    def written_by(self, user):
+        # author_id 가 없는 예전 쪽지는 닉네임으로 비교
+        if user is None:
+            return False
+        if self.author_id is not None:
+            return self.author_id == user._id
+        return self.author == user.nickname
+
+    def __repr__(self):
+        return f'Message({self._id}, to={self.recipient_id!r})'
+
+
+# 조회할 때 가져오는 필드 (모델에 없는 필드, 특히 비밀번호는 가져오지 않음)
+USER_PROJECTION = {field: 1 for field in User.__slots__[1:]}
+USER_LIST_PROJECTION = {'name': 1, 'nickname': 1, 'profile_picture': 1}  # 유저 목록 화면
+MESSAGE_PROJECTION = {field: 1 for field in Message.STORED}
+ACCOUNT_MESSAGE_PROJECTION = {'recipient_id': 1, 'author': 1, 'file_url': 1}  # 탈퇴 후 정리
+SNAPSHOT_PROJECTION = {'recipient_id': 1, 'recipient_name': 1, 'author': 1, 'author_id': 1}  # migrate-snapshots
+
+# 받는 사람 이름을 알 수 없을 때 보여주는 값 (탈퇴했거나 이름이 비어 있음)
+RECIPIENT_NOT_FOUND = 'Name not found'
+RECIPIENT_NO_NAME = 'No Name'
+
+
+class ModelCursor:
+    # 커서를 순회하면서 문서를 모델 객체로 바꿔 줌 (리스트로 만들지 않으므로 스트리밍 렌더링에 그대로 사용)
+    def __init__(self, cursor, model):
+        self.cursor = cursor
+        self.model = model
+
+    def __iter__(self):
+        for doc in self.cursor:
+            yield self.model.from_doc(doc)
+
+    def close(self):
+        close = getattr(self.cursor, 'close', None)
+        if close is not None:
+            close()
+
+
+def _coord_range(low, high):
+    cond = {}
+    if low is not None:
+        cond['$gte'] = low
+    if high is not None:
+        cond['$lt'] = high
+    return cond
+
+
+def _account_query(author_id, nickname, recipient_id):
+    # 사용자가 작성한 쪽지 (author_id 가 없는 예전 쪽지는 닉네임으로) + 본인 보드의 쪽지
+    return {'$or': [
+        {'author_id': author_id},
+        {'author_id': {'$exists': False}, 'author': nickname},
+        {'recipient_id': recipient_id}
+    ]}
+
+
+def _object_id(value):
+    return ObjectId(value) if ObjectId.is_valid(value) else None
+
+
+def _after_position(after_y, after_id):
+    # (y, _id) 순서에서 after 다음 쪽지 / y 가 None 이면 좌표가 없는 예전 쪽지 중 다음 것과 좌표가 있는 쪽지 전부
+    if after_y is None:
+        return {'$or': [{'newy': None, '_id': {'$gt': after_id}}, {'newy': {'$ne': None}}]}
+    return {'$or': [{'newy': {'$gt': after_y}}, {'newy': after_y, '_id': {'$gt': after_id}}]}
+
+
+def _includes_origin(x0, y0, x1, y1):
+    # 한 번도 옮기지 않은 예전 쪽지는 좌표가 없어서 (0, 0)에 그려지므로 원점이 포함된 영역에 같이 내려줌
+    return ((y0 is None or y0 <= 0) and (y1 is None or y1 > 0)
+            and (x0 is None or x0 <= 0) and (x1 is None or x1 > 0))
+
+
+class MongoUserRepository:
+    """users 컬렉션 조회/변경을 모아 둔 곳 (모든 조회에 projection 지정)."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def get(self, user_id):
+        doc = self.collection.find_one({'_id': user_id}, USER_PROJECTION)
+        return User.from_doc(doc) if doc else None
+
+    def get_by_username(self, username):
+        doc = self.collection.find_one({'username': username}, USER_PROJECTION)
+        return User.from_doc(doc) if doc else None
+
+    def exists(self, username):
+        return self.collection.find_one({'username': username}, {'_id': 1}) is not None
+
+    def credentials(self, username):
+        # 로그인 확인용: (사용자, 저장된 비밀번호) / 없으면 (None, None)
+        doc = self.collection.find_one({'username': username}, {**USER_PROJECTION, 'password': 1})
+        if doc is None:
+            return None, None
+        return User.from_doc(doc), doc.get('password')
+
+    def password_of(self, user_id):
+        doc = self.collection.find_one({'_id': user_id}, {'password': 1, '_id': 0})
+        return doc.get('password') if doc else None
+
+    def create(self, username, password, name, nickname, profile_picture=None):
+        # 같은 아이디가 이미 있으면 DuplicateKeyError (username unique 인덱스)
+        doc = {
+            'username': username,
+            'password': password,
+            'name': name,
+            'nickname': nickname,
+            'profile_picture': profile_picture
+        }
+        self.collection.insert_one(doc)
+        return User.from_doc(doc)
+
+    def by_name(self, after=None, limit=0):
+        # 이름순 목록 / after=(이름, _id) 이면 그 다음부터 (name + _id 인덱스 사용)
+        query = {}
+        if after is not None:
+            after_name, after_id = after
+            query = {'$or': [
+                {'name': {'$gt': after_name}},
+                {'name': after_name, '_id': {'$gt': after_id}}
+            ]}
+        cursor = self.collection.find(query, USER_LIST_PROJECTION).sort([('name', 1), ('_id', 1)])
+        if limit:
+            cursor = cursor.limit(limit)
+        return ModelCursor(cursor, User)
+
+    def update_profile(self, user_id, name, nickname, profile_picture, password=None):
+        fields = {'name': name, 'nickname': nickname, 'profile_picture': profile_picture}
+        if password is not None:
+            fields['password'] = password
+        return self._update(user_id, fields)
+
+    def set_password(self, user_id, password):
+        return self._update(user_id, {'password': password})
+
+    def _update(self, user_id, fields):
+        # 토큰 버전을 올려서 예전 정보가 담긴 토큰은 더 이상 재발급되지 않도록 함 / 바뀐 사용자 반환
+        doc = self.collection.find_one_and_update(
+            {'_id': user_id},
+            {'$set': fields, '$inc': {'token_version': 1}},
+            projection=USER_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+        return User.from_doc(doc) if doc else None
+
+    def delete(self, user_id):
+        # 삭제한 사용자 (삭제 직전 값) / 없으면 None
+        doc = self.collection.find_one_and_delete({'_id': user_id}, projection=USER_PROJECTION)
+        return User.from_doc(doc) if doc else None
+
+    def referenced_pictures(self, file_urls):
+        # 프로필 사진으로 참조 중인 경로만 반환 (인덱스만 읽는 조회)
+        return {doc['profile_picture']
+                for doc in self.collection.find({'profile_picture': {'$in': file_urls}}, {'profile_picture': 1, '_id': 0})}
+
+
+class MongoMessageRepository:
+    """messages 컬렉션 조회/변경을 모아 둔 곳 (모든 조회에 projection 지정)."""
+
+    def __init__(self, collection, users_collection):
+        self.collection = collection
+        self.users_collection = users_collection
+
+    def get(self, message_id):
+        doc = self.collection.find_one({'_id': message_id}, MESSAGE_PROJECTION)
+        return Message.from_doc(doc) if doc else None
+
+    def insert(self, message):
+        message._id = self.collection.insert_one(message.to_doc()).inserted_id
+        return message
+
+    def move(self, message_id, x, y):
+        self.collection.update_one({'_id': message_id}, {'$set': {'newx': x, 'newy': y}})
+
+    def save_positions(self, updates, write_concern=None):
+        # updates: {쪽지 id: {'newx', 'newy', ('rev')}} -> 한 번의 bulk write
+        collection = self.collection
+        if write_concern is not None:
+            collection = collection.with_options(write_concern=write_concern)
+        collection.bulk_write([UpdateOne({'_id': message_id}, {'$set': update}) for message_id, update in updates.items()],
+                              ordered=False)
+
+    def delete(self, message_id):
+        return self.collection.delete_one({'_id': message_id}).deleted_count
+
+    def delete_many(self, message_ids):
+        return self.collection.delete_many({'_id': {'$in': list(message_ids)}}).deleted_count
+
+    def for_board(self, recipient_id):
+        return ModelCursor(self.collection.find({'recipient_id': recipient_id}, MESSAGE_PROJECTION), Message)
+
+    def board_window(self, recipient_id, x0, y0, x1, y1, limit, after=None):
+        # 롤링페이퍼에서 사각형 영역 안의 쪽지를 (y, _id) 순서로 조회 (값이 None이면 그 방향으로는 제한 없음)
+        # after=(y, _id) 이면 그 다음부터 (같은 y 에 쪽지가 많아 limit 에 걸려도 빠지는 쪽지가 없도록)
+        query = {'recipient_id': recipient_id}
+        y_range = _coord_range(y0, y1)
+        x_range = _coord_range(x0, x1)
+        if y_range:
+            query['newy'] = y_range
+        if x_range:
+            query['newx'] = x_range
+        if _includes_origin(x0, y0, x1, y1):
+            query = {'$or': [query, {'recipient_id': recipient_id, 'newy': None}]}
+        if after is not None:
+            query = {'$and': [query, _after_position(*after)]}
+        cursor = self.collection.find(query, MESSAGE_PROJECTION).sort([('newy', 1), ('_id', 1)]).limit(limit)
+        return [Message.from_doc(doc) for doc in cursor]
+
+    def board_extent(self, recipient_id):
+        # 보드 전체 높이 (가장 아래 쪽지의 y 좌표) - 인덱스 끝에서 한 건만 읽음
+        lowest = self.collection.find_one(
+            {'recipient_id': recipient_id, 'newy': {'$ne': None}},
+            {'newy': 1},
+            sort=[('newy', -1)]
+        )
+        return lowest['newy'] if lowest else 0
+
+    def changed_since(self, recipient_id, since, limit, until=None):
+        # since 보다 뒤 (until 이 있으면 until 까지) 변경된 쪽지를 revision 순으로
+        query = {'recipient_id': recipient_id, 'rev': {'$gt': since}}
+        if until is not None:
+            query['rev']['$lte'] = until
+        return [Message.from_doc(doc)
+                for doc in self.collection.find(query, MESSAGE_PROJECTION).sort('rev', 1).limit(limit)]
+
+    def recipients_of(self, message_ids):
+        return self.collection.distinct('recipient_id', {'_id': {'$in': list(message_ids)}})
+
+    def recipients_by_note(self, message_ids):
+        # {쪽지 id: 보드 주인 id} / 없는 쪽지는 빠짐
+        return {doc['_id']: doc.get('recipient_id')
+                for doc in self.collection.find({'_id': {'$in': list(message_ids)}}, {'recipient_id': 1})}
+
+    def authored_by(self, author_id, nickname=None, before=None, limit=0):
+        # 작성한 쪽지를 최신순으로 (author_id + _id 인덱스) / 받은 사람 이름은 쪽지에 저장된 사본을 사용
+        # nickname 을 주면 migrate-snapshots 로 author_id 를 채우기 전의 예전 쪽지도 닉네임으로 찾음
+        query = {'author_id': author_id}
+        if nickname is not None:
+            query = {'$or': [query, {'author_id': {'$exists': False}, 'author': nickname}]}
+        if before is not None:
+            query = {'$and': [query, {'_id': {'$lt': before}}]}
+        cursor = self.collection.find(query, MESSAGE_PROJECTION).sort('_id', -1)
+        if limit:
+            cursor = cursor.limit(limit)
+        docs = list(cursor)
+        self._fill_recipient_names(docs)
+        return ModelCursor(iter(docs), Message)
+
+    def _fill_recipient_names(self, docs):
+        # 이름 사본이 아직 없는 예전 쪽지만 users 에서 한 번에 찾아 채움 (마이그레이션이 끝나면 조회 없음)
+        # $lookup 으로 합치려면 문자열 recipient_id 를 $convert 로 ObjectId 로 바꿔야 해서 모든 쪽지마다 조회가 붙음
+        # -> 사본이 있는 쪽지는 find 한 번으로 끝내고, 예전 쪽지가 섞인 페이지만 users 를 한 번 더 읽음
+        missing = {_object_id(doc.get('recipient_id')) for doc in docs if 'recipient_name' not in doc}
+        missing.discard(None)
+        if not missing:
+            return
+        names = {str(user['_id']): user.get('name') or RECIPIENT_NO_NAME
+                 for user in self.users_collection.find({'_id': {'$in': list(missing)}}, {'name': 1})}
+        for doc in docs:
+            if 'recipient_name' not in doc:
+                doc['recipient_name'] = names.get(doc.get('recipient_id'), RECIPIENT_NOT_FOUND)
+
+    def account_batch(self, author_id, nickname, recipient_id, limit):
+        # 탈퇴한 사용자가 작성한 쪽지 + 본인 보드의 쪽지 중 limit 개
+        query = _account_query(author_id, nickname, recipient_id)
+        return [Message.from_doc(doc) for doc in self.collection.find(query, ACCOUNT_MESSAGE_PROJECTION).limit(limit)]
+
+    def delete_for_account(self, author_id, nickname, recipient_id):
+        return self.collection.delete_many(_account_query(author_id, nickname, recipient_id)).deleted_count
+
+    def sync_author(self, author_id, nickname, limit, revision=None):
+        # 작성자 닉네임 사본이 예전 값인 쪽지를 limit 개까지 고침 / 고친 쪽지들의 recipient_id 목록 (없으면 끝)
+        docs = list(self.collection.find({'author_id': author_id, 'author': {'$ne': nickname}}, {'recipient_id': 1})
+                    .limit(limit))
+        self._set_snapshot([doc['_id'] for doc in docs], {'author': nickname}, revision)
+        return [doc['recipient_id'] for doc in docs]
+
+    def sync_recipient(self, recipient_id, name, limit, revision=None):
+        # 받는 사람 이름 사본이 예전 값인 쪽지를 limit 개까지 고침 / 고친 개수 (0이면 끝)
+        name = name or RECIPIENT_NO_NAME
+        ids = [doc['_id'] for doc in self.collection.find({'recipient_id': recipient_id, 'recipient_name': {'$ne': name}},
+                                                          {'_id': 1}).limit(limit)]
+        self._set_snapshot(ids, {'recipient_name': name}, revision)
+        return len(ids)
+
+    def _set_snapshot(self, ids, fields, revision):
+        # revision 이 있으면 쪽지마다 새 rev 도 기록 (변경 목록을 받는 클라이언트가 바뀐 이름을 받도록)
+        if not ids:
+            return
+        if revision is None:
+            self.collection.update_many({'_id': {'$in': ids}}, {'$set': fields})
+            return
+        with revision(len(ids)) as first:
+            self.collection.bulk_write([UpdateOne({'_id': message_id}, {'$set': dict(fields, rev=first + i)})
+                                        for i, message_id in enumerate(ids)], ordered=False)
+
+    def backfill_snapshots(self, after_id, limit):
+        # _id 순서로 after_id 다음부터 limit 개를 읽어 author_id / recipient_name 이 없는 쪽지에 채움
+        # 반환: (이번에 읽은 마지막 _id, 없으면 None), {'scanned', 'updated', 'unresolved'}
+        query = {'_id': {'$gt': after_id}} if after_id is not None else {}
+        docs = list(self.collection.find(query, SNAPSHOT_PROJECTION).sort('_id', 1).limit(limit))
+        report = {'scanned': len(docs), 'updated': 0, 'unresolved': 0}
+        if not docs:
+            return None, report
+
+        nicknames = {doc.get('author') for doc in docs if 'author_id' not in doc}
+        authors = {}  # 닉네임 -> [user _id] (같은 닉네임이 여러 명이면 정할 수 없음)
+        for user in self.users_collection.find({'nickname': {'$in': [n for n in nicknames if n]}}, {'nickname': 1}):
+            authors.setdefault(user['nickname'], []).append(user['_id'])
+        recipient_ids = {_object_id(doc.get('recipient_id')) for doc in docs if 'recipient_name' not in doc}
+        recipient_ids.discard(None)
+        names = {str(user['_id']): user.get('name') or RECIPIENT_NO_NAME
+                 for user in self.users_collection.find({'_id': {'$in': list(recipient_ids)}}, {'name': 1})}
+
+        ops = []
+        for doc in docs:
+            matches = authors.get(doc.get('author'), []) if 'author_id' not in doc else []
+            if len(matches) == 1:
+                # 그 사이 새로 저장된 값은 덮어쓰지 않도록 필드가 없을 때만
+                ops.append(UpdateOne({'_id': doc['_id'], 'author_id': {'$exists': False}},
+                                     {'$set': {'author_id': matches[0]}}))
+            elif 'author_id' not in doc:
+                report['unresolved'] += 1  # 탈퇴했거나 같은 닉네임이 여러 명
+            if 'recipient_name' not in doc and doc.get('recipient_id') in names:
+                ops.append(UpdateOne({'_id': doc['_id'], 'recipient_name': {'$exists': False}},
+                                     {'$set': {'recipient_name': names[doc['recipient_id']]}}))
+        if ops:
+            report['updated'] = self.collection.bulk_write(ops, ordered=False).modified_count
+        return docs[-1]['_id'], report
+
+    def detach_file(self, message_id, file_url):
+        # 첨부 파일 참조를 떼어냄 / 이번 호출에서 떼어냈으면 True (다시 실행돼도 두 번 해제하지 않도록)
+        result = self.collection.update_one({'_id': message_id, 'file_url': file_url}, {'$unset': {'file_url': ''}})
+        return result.modified_count > 0
+
+    def referenced_files(self, file_urls):
+        # 쪽지 첨부로 참조 중인 경로만 반환 (인덱스만 읽는 조회)
+        return {doc['file_url'] for doc in self.collection.find({'file_url': {'$in': file_urls}}, {'file_url': 1, '_id': 0})}
+
+
+def _in_range(value, low, high):
+    if low is None and high is None:
+        return True
+    if value is None:
+        return False
+    return (low is None or value >= low) and (high is None or value < high)
+
+
+def _null_first(value):
+    # MongoDB 정렬과 같이 값이 없는 문서가 먼저
+    return (0, 0) if value is None else (1, value)
+
+
+class MemoryUserRepository:
+    """MongoUserRepository 와 같은 동작을 프로세스 안 dict 로 하는 저장소 (테스트/벤치마크용)."""
+
+    def __init__(self):
+        self.docs = {}  # _id -> 문서
+        self._lock = threading.Lock()
+
+    def _find(self, **match):
+        with self._lock:
+            for doc in self.docs.values():
+                if all(doc.get(key) == value for key, value in match.items()):
+                    return dict(doc)
+        return None
+
+    def get(self, user_id):
+        doc = self.docs.get(user_id)
+        return User.from_doc(doc) if doc else None
+
+    def get_by_username(self, username):
+        doc = self._find(username=username)
+        return User.from_doc(doc) if doc else None
+
+    def exists(self, username):
+        return self._find(username=username) is not None
+
+    def credentials(self, username):
+        doc = self._find(username=username)
+        if doc is None:
+            return None, None
+        return User.from_doc(doc), doc.get('password')
+
+    def password_of(self, user_id):
+        doc = self.docs.get(user_id)
+        return doc.get('password') if doc else None
+
+    def create(self, username, password, name, nickname, profile_picture=None):
+        doc = {
+            '_id': ObjectId(),
+            'username': username,
+            'password': password,
+            'name': name,
+            'nickname': nickname,
+            'profile_picture': profile_picture
+        }
+        with self._lock:
+            if any(other['username'] == username for other in self.docs.values()):
+                raise DuplicateKeyError(f'duplicate username: {username}')
+            self.docs[doc['_id']] = doc
+        return User.from_doc(doc)
+
+    def by_name(self, after=None, limit=0):
+        with self._lock:
+            docs = sorted(self.docs.values(), key=lambda doc: (doc.get('name') or '', doc['_id']))
+        if after is not None:
+            docs = [doc for doc in docs if (doc.get('name') or '', doc['_id']) > after]
+        if limit:
+            docs = docs[:limit]
+        return ModelCursor(iter([{'_id': doc['_id'], **{key: doc.get(key) for key in USER_LIST_PROJECTION}}
+                                 for doc in docs]), User)
+
+    def update_profile(self, user_id, name, nickname, profile_picture, password=None):
+        fields = {'name': name, 'nickname': nickname, 'profile_picture': profile_picture}
+        if password is not None:
+            fields['password'] = password
+        return self._update(user_id, fields)
+
+    def set_password(self, user_id, password):
+        return self._update(user_id, {'password': password})
+
+    def _update(self, user_id, fields):
+        with self._lock:
+            doc = self.docs.get(user_id)
+            if doc is None:
+                return None
+            doc.update(fields)
+            doc['token_version'] = doc.get('token_version', 0) + 1
+            return User.from_doc(doc)
+
+    def delete(self, user_id):
+        with self._lock:
+            doc = self.docs.pop(user_id, None)
+        return User.from_doc(doc) if doc else None
+
+    def referenced_pictures(self, file_urls):
+        file_urls = set(file_urls)
+        with self._lock:
+            return {doc['profile_picture'] for doc in self.docs.values() if doc.get('profile_picture') in file_urls}
+
+
+class MemoryMessageRepository:
+    """MongoMessageRepository 와 같은 동작을 프로세스 안 dict 로 하는 저장소 (테스트/벤치마크용)."""
+
+    def __init__(self, users):
+        self.users = users  # 받는 사람 이름을 찾을 MemoryUserRepository
+        self.docs = {}  # _id -> 문서
+        self._lock = threading.Lock()
+
+    def _select(self, predicate):
+        with self._lock:
+            return [dict(doc) for doc in self.docs.values() if predicate(doc)]
+
+    def get(self, message_id):
+        doc = self.docs.get(message_id)
+        return Message.from_doc(doc) if doc else None
+
+    def insert(self, message):
+        message._id = ObjectId()
+        with self._lock:
+            self.docs[message._id] = {'_id': message._id, **message.to_doc()}
+        return message
+
+    def move(self, message_id, x, y):
+        with self._lock:
+            doc = self.docs.get(message_id)
+            if doc is not None:
+                doc.update(newx=x, newy=y)
+
+    def save_positions(self, updates, write_concern=None):
+        with self._lock:
+            for message_id, update in updates.items():
+                doc = self.docs.get(message_id)
+                if doc is not None:
+                    doc.update(update)
+
+    def delete(self, message_id):
+        with self._lock:
+            return 1 if self.docs.pop(message_id, None) is not None else 0
+
+    def delete_many(self, message_ids):
+        with self._lock:
+            return sum(1 for message_id in message_ids if self.docs.pop(message_id, None) is not None)
+
+    def for_board(self, recipient_id):
+        return ModelCursor(iter(self._select(lambda doc: doc.get('recipient_id') == recipient_id)), Message)
+
+    def board_window(self, recipient_id, x0, y0, x1, y1, limit, after=None):
+        origin = _includes_origin(x0, y0, x1, y1)
+
+        def position(doc):
+            return _null_first(doc.get('newy')), doc['_id']
+
+        def inside(doc):
+            if doc.get('recipient_id') != recipient_id:
+                return False
+            if after is not None and position(doc) <= (_null_first(after[0]), after[1]):
+                return False
+            if origin and doc.get('newy') is None:
+                return True
+            return _in_range(doc.get('newy'), y0, y1) and _in_range(doc.get('newx'), x0, x1)
+
+        docs = sorted(self._select(inside), key=position)
+        return [Message.from_doc(doc) for doc in docs[:limit]]
+
+    def board_extent(self, recipient_id):
+        values = [doc['newy'] for doc in self._select(lambda doc: doc.get('recipient_id') == recipient_id)
+                  if doc.get('newy') is not None]
+        return max(values) if values else 0
+
+    def changed_since(self, recipient_id, since, limit, until=None):
+        def changed(doc):
+            rev = doc.get('rev') or 0
+            return doc.get('recipient_id') == recipient_id and rev > since and (until is None or rev <= until)
+
+        docs = self._select(changed)
+        docs.sort(key=lambda doc: doc['rev'])
+        return [Message.from_doc(doc) for doc in docs[:limit]]
+
+    def recipients_of(self, message_ids):
+        message_ids = set(message_ids)
+        return list({doc['recipient_id'] for doc in self._select(lambda doc: doc['_id'] in message_ids)})
+
+    def recipients_by_note(self, message_ids):
+        message_ids = set(message_ids)
+        return {doc['_id']: doc.get('recipient_id') for doc in self._select(lambda doc: doc['_id'] in message_ids)}
+
+    def authored_by(self, author_id, nickname=None, before=None, limit=0):
+        def mine(doc):
+            if before is not None and doc['_id'] >= before:
+                return False
+            if 'author_id' in doc:
+                return doc['author_id'] == author_id
+            return nickname is not None and doc.get('author') == nickname
+
+        docs = self._select(mine)
+        docs.sort(key=lambda doc: doc['_id'], reverse=True)
+        if limit:
+            docs = docs[:limit]
+        for doc in docs:
+            if 'recipient_name' not in doc:
+                recipient = self.users.docs.get(_object_id(doc.get('recipient_id')))
+                doc['recipient_name'] = RECIPIENT_NOT_FOUND if recipient is None else (recipient.get('name') or RECIPIENT_NO_NAME)
+        return ModelCursor(iter(docs), Message)
+
+    def _of_account(self, author_id, nickname, recipient_id):
+        return lambda doc: (doc.get('author_id') == author_id if 'author_id' in doc else doc.get('author') == nickname) \
+            or doc.get('recipient_id') == recipient_id
+
+    def account_batch(self, author_id, nickname, recipient_id, limit):
+        docs = self._select(self._of_account(author_id, nickname, recipient_id))
+        return [Message.from_doc(doc) for doc in docs[:limit]]
+
+    def delete_for_account(self, author_id, nickname, recipient_id):
+        return self.delete_many([doc['_id'] for doc in self._select(self._of_account(author_id, nickname, recipient_id))])
+
+    def sync_author(self, author_id, nickname, limit, revision=None):
+        with self._lock:
+            docs = [doc for doc in self.docs.values()
+                    if doc.get('author_id') == author_id and doc.get('author') != nickname][:limit]
+        self._set_snapshot(docs, {'author': nickname}, revision)
+        return [doc['recipient_id'] for doc in docs]
+
+    def sync_recipient(self, recipient_id, name, limit, revision=None):
+        name = name or RECIPIENT_NO_NAME
+        with self._lock:
+            docs = [doc for doc in self.docs.values()
+                    if doc.get('recipient_id') == recipient_id and doc.get('recipient_name') != name][:limit]
+        self._set_snapshot(docs, {'recipient_name': name}, revision)
+        return len(docs)
+
+    def _set_snapshot(self, docs, fields, revision):
+        if not docs:
+            return
+        if revision is None:
+            with self._lock:
+                for doc in docs:
+                    doc.update(fields)
+            return
+        with revision(len(docs)) as first:
+            with self._lock:
+                for i, doc in enumerate(docs):
+                    doc.update(fields, rev=first + i)
+
+    def backfill_snapshots(self, after_id, limit):
+        with self._lock:
+            docs = sorted((doc for doc in self.docs.values() if after_id is None or doc['_id'] > after_id),
+                          key=lambda doc: doc['_id'])[:limit]
+            report = {'scanned': len(docs), 'updated': 0, 'unresolved': 0}
+            for doc in docs:
+                if 'author_id' not in doc:
+                    matches = [user['_id'] for user in self.users.docs.values() if user.get('nickname') == doc.get('author')]
+                    if len(matches) == 1:
+                        doc['author_id'] = matches[0]
+                        report['updated'] += 1
+                    else:
+                        report['unresolved'] += 1
+                if 'recipient_name' not in doc:
+                    recipient = self.users.docs.get(_object_id(doc.get('recipient_id')))
+                    if recipient is not None:
+                        doc['recipient_name'] = recipient.get('name') or RECIPIENT_NO_NAME
+                        report['updated'] += 1
+        return (docs[-1]['_id'] if docs else None), report
+
+    def detach_file(self, message_id, file_url):
+        with self._lock:
+            doc = self.docs.get(message_id)
+            if doc is None or doc.get('file_url') != file_url:
+                return False
+            del doc['file_url']
+            return True
+
+    def referenced_files(self, file_urls):
+        file_urls = set(file_urls)
+        return {doc['file_url'] for doc in self._select(lambda doc: doc.get('file_url') in file_urls)}
+
+
+class SnapshotMigration:
+    """예전 쪽지에 author_id / recipient_name 사본을 채우는 온라인 마이그레이션.
+
+    _id 순서로 한 배치씩 처리하고 어디까지 했는지 state_collection 에 저장하므로,
+    서비스 중에 조금씩 실행하거나 중단된 뒤 다시 실행해도 이어서 진행한다.
+    """
+
+    def __init__(self, messages, state_collection, key='snapshot_migration'):
+        self.messages = messages
+        self.state_collection = state_collection
+        self.key = key
+
+    def state(self):
+        return self.state_collection.find_one({'_id': self.key}) or {}
+
+    def run_batch(self, batch_size):
+        state = self.state()
+        if state.get('done'):
+            return {'scanned': 0, 'updated': 0, 'unresolved': 0, 'done': True}
+        last_id, report = self.messages.backfill_snapshots(state.get('last_id'), batch_size)
+        update = {'$inc': {'scanned': report['scanned'], 'updated': report['updated'], 'unresolved': report['unresolved']}}
+        update['$set'] = {'done': True} if last_id is None else {'last_id': last_id}
+        self.state_collection.update_one({'_id': self.key}, update, upsert=True)
+        report['done'] = last_id is None
+        return report
+
+    def reset(self):
+        self.state_collection.delete_one({'_id': self.key})
+
+
+def register_cli(app, migration):
+    # 예전 쪽지에 author_id / 받는 사람 이름 사본 채우기: flask --app app migrate-snapshots
+    @app.cli.command('migrate-snapshots')
+    @click.option('--batch-size', default=500, help='한 번에 처리할 쪽지 수')
+    @click.option('--max-batches', default=0, help='이번 실행에서 처리할 최대 배치 수 (0이면 끝까지)')
+    @click.option('--pause', default=0.0, help='배치 사이에 쉬는 시간(초) - 서비스 중 DB 부하를 줄이려면')
+    @click.option('--restart', is_flag=True, help='처음부터 다시')
+    def migrate_snapshots_command(batch_size, max_batches, pause, restart):
+        # 서비스를 멈추지 않고 실행 가능, 중단되면 다음 실행에서 이어서 진행
+        if restart:
+            migration.reset()
+        batches = 0
+        while True:
+            report = migration.run_batch(batch_size)
+            batches += 1
+            click.echo(f"scanned {report['scanned']}, updated {report['updated']}, unresolved {report['unresolved']}")
+            if report['done']:
+                state = migration.state()
+                click.echo(f"done: {state.get('updated', 0)} fields updated, {state.get('unresolved', 0)} notes without a "
+                           f"matching author (deleted or duplicate nickname)")
+                break
+            if max_batches and batches >= max_batches:
+                break
+            time.sleep(pause)
+
+
+def make_repositories(backend, db=None):
+    # 'mongo': db 의 users/messages 컬렉션 (기본), 'memory': 프로세스 안 dict (테스트/벤치마크용)
+    if backend == 'memory':
+        users = MemoryUserRepository()
+        return users, MemoryMessageRepository(users)
+    return MongoUserRepository(db['users']), MongoMessageRepository(db['messages'], db['users'])
@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+
+
+class RevisionCounter:
+    """쪽지 변경마다 붙이는 전체 공용 revision 번호 (counters 컬렉션, 계속 증가).
+
+    번호는 쓰기 전에 받으므로 더 큰 번호의 쓰기가 먼저 끝날 수 있다. 그래서 allocate() 로 번호를 받는 동안
+    leases 컬렉션에 '쓰는 중' 기록(floor = 받을 수 있는 가장 작은 번호)을 남기고, 쓰기가 끝나면 지운다.
+    safe() 는 아직 쓰는 중인 번호보다 앞 번호까지만 반환하므로 변경 목록을 safe() 까지 읽으면 빠지는 변경이 없다.
+    lease_seconds 가 지난 기록(쓰는 중에 프로세스가 죽은 경우)은 무시한다.
+    """
+
+    def __init__(self, counters, leases, key='revision', lease_seconds=60):
+        self.counters = counters  # {'_id': key, 'version': 마지막으로 발급한 번호}
+        self.leases = leases  # {'floor': 번호, 'at': 기록한 시각}
+        self.key = key
+        self.lease_seconds = lease_seconds
+
+    def current(self):
+        counter = self.counters.find_one({'_id': self.key}, {'version': 1})
+        return counter['version'] if counter else 0
+
+    @contextmanager
+    def allocate(self, count=1):
+        # with revisions.allocate(n) as first: 블록 안에서 first ~ first+n-1 번호로 저장
+        # 번호를 받기 전에 기록부터 남김 (받을 번호는 지금 값보다 크므로 floor 이상)
+        lease_id = self.leases.insert_one({
+            'floor': self.current() + 1,
+            'at': datetime.now(timezone.utc)
+        }).inserted_id
+        try:
+            counter = self.counters.find_one_and_update(
+                {'_id': self.key},
+                {'$inc': {'version': count}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+            yield counter['version'] - count + 1
+        finally:
+            self.leases.delete_one({'_id': lease_id})
+
+    def safe(self):
+        # 번호를 먼저 읽고 기록을 읽음 -> 읽은 번호 이하를 받은 쓰기 중 아직 안 끝난 것은 반드시 기록이 보임
+        current = self.current()
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.lease_seconds)
+        lease = self.leases.find_one({'at': {'$gte': cutoff}}, {'floor': 1}, sort=[('floor', 1)])
+        return current if lease is None else min(current, lease['floor'] - 1)
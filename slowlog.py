@@ -0,0 +1,185 @@
+import json
+import queue
+import threading
+from datetime import datetime, timezone
+
+from pymongo.errors import CollectionInvalid, PyMongoError
+from pymongo.monitoring import CommandListener
+
+from background import BackgroundThread
+
+# 느린 쿼리로 기록하는 명령과, 그 명령에서 조건/정렬을 꺼내는 방법
+QUERY_COMMANDS = {
+    'find': lambda cmd: (cmd.get('filter', {}), cmd.get('sort', {})),
+    'count': lambda cmd: (cmd.get('query', {}), {}),
+    'distinct': lambda cmd: (cmd.get('query', {}), {}),
+    'findAndModify': lambda cmd: (cmd.get('query', {}), cmd.get('sort', {})),
+    'delete': lambda cmd: (cmd.get('deletes', [{}])[0].get('q', {}), {}),
+    'update': lambda cmd: (cmd.get('updates', [{}])[0].get('q', {}), {}),
+    'aggregate': lambda cmd: (_first_match(cmd.get('pipeline', [])), {}),
+}
+RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte', '$ne', '$nin', '$exists'}
+# explain 할 때 빼는 필드 (세션/트랜잭션 정보)
+EXPLAIN_SKIP_FIELDS = {'lsid', 'txnNumber', 'writeConcern', 'autocommit', 'startTransaction'}
+
+
+def _first_match(pipeline):
+    if pipeline and '$match' in pipeline[0]:
+        return pipeline[0]['$match']
+    return {}
+
+
+def query_shape(value):
+    # 값은 타입 이름으로 바꿔서 같은 모양의 쿼리를 하나로 묶음 ({'author': 'kim'} -> {'author': 'str'})
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [query_shape(value[0])] if value else []
+    return type(value).__name__
+
+
+def suggest_index(filter, sort):
+    # 같음 조건 -> 정렬 -> 범위 조건 순서로 인덱스 키 제안 (ESR 규칙)
+    equality, ranges = [], []
+    for field, condition in filter.items():
+        if field.startswith('$'):
+            continue  # $or 등은 분기마다 따로 봐야 하므로 제안하지 않음
+        if isinstance(condition, dict) and any(op in RANGE_OPERATORS for op in condition):
+            ranges.append(field)
+        else:
+            equality.append(field)
+    keys = [(field, 1) for field in equality]
+    keys += [(field, direction) for field, direction in sort.items() if field not in equality]
+    keys += [(field, 1) for field in ranges if field not in sort]
+    return keys
+
+
+def _plan_stages(plan):
+    # explain 결과의 winningPlan 에 나오는 stage 이름들
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages += _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            stages += _plan_stages(item)
+    return stages
+
+
+class SlowQueryLog(CommandListener):
+    """threshold_ms 보다 오래 걸린 명령을 쿼리 모양별로 모으는 pymongo 리스너.
+
+    처음 보는 느린 모양이면 백그라운드 스레드에서 explain 을 한 번 실행하고 결과를
+    capped 컬렉션에 저장한다. collection scan 이면 필요한 인덱스를 함께 제안한다.
+    """
+
+    def __init__(self, threshold_ms=100, collection_name='slow_queries', capped_size=16 * 1024 * 1024,
+                 max_shapes=1000):
+        self.threshold_ms = threshold_ms
+        self.collection_name = collection_name
+        self.capped_size = capped_size
+        self.max_shapes = max_shapes
+        self.db = None
+        self.shapes = {}  # 모양 -> {'count', 'total_ms', 'max_ms'} (프로세스별)
+        self._commands = {}  # (connection, request_id) -> 명령 (끝날 때까지만 보관)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(100)
+        self._thread = BackgroundThread(self._run, 'slow-query-explain')
+        self._collection_ready = False
+
+    def bind(self, db):
+        self.db = db
+
+    def started(self, event):
+        if event.command_name in QUERY_COMMANDS:
+            with self._lock:
+                self._commands[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        if event.command_name not in QUERY_COMMANDS:
+            return
+        with self._lock:
+            started = self._commands.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if started is None or duration_ms < self.threshold_ms:
+            return
+        database_name, command = started
+        collection = command.get(event.command_name)
+        if collection == self.collection_name:
+            return
+
+        filter, sort = QUERY_COMMANDS[event.command_name](command)
+        shape = json.dumps([event.command_name, collection, query_shape(filter), list(sort)], sort_keys=True)
+        with self._lock:
+            stats = self.shapes.get(shape)
+            new = stats is None
+            if new:
+                if len(self.shapes) >= self.max_shapes:
+                    return
+                stats = self.shapes[shape] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+            stats['count'] += 1
+            stats['total_ms'] += duration_ms
+            stats['max_ms'] = max(stats['max_ms'], duration_ms)
+
+        if new:
+            # explain 은 요청 스레드를 막지 않도록 백그라운드에서 실행 (밀리면 버림)
+            try:
+                self._queue.put_nowait((shape, database_name, event.command_name, collection, command, filter, sort,
+                                        duration_ms))
+            except queue.Full:
+                return
+            self._thread.ensure()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                self._record(*item)
+            except PyMongoError as e:
+                print(f'slow query explain failed: {e}')
+
+    def _collection(self):
+        if not self._collection_ready:
+            try:
+                self.db.create_collection(self.collection_name, capped=True, size=self.capped_size)
+            except CollectionInvalid:
+                pass  # 이미 있음
+            self._collection_ready = True
+        return self.db[self.collection_name]
+
+    def _record(self, shape, database_name, command_name, collection, command, filter, sort, duration_ms):
+        explain_command = {key: value for key, value in command.items()
+                           if key not in EXPLAIN_SKIP_FIELDS and not key.startswith('$')}
+        try:
+            explain = self.db.client[database_name].command({'explain': explain_command, 'verbosity': 'queryPlanner'})
+            stages = _plan_stages(explain.get('queryPlanner', {}).get('winningPlan', {}))
+        except PyMongoError as e:
+            error, stages = str(e), []
+        else:
+            error = None
+
+        collscan = 'COLLSCAN' in stages
+        suggested = suggest_index(filter, sort) if collscan else []
+        self._collection().insert_one({
+            'shape': shape,
+            'command': command_name,
+            'collection': collection,
+            'duration_ms': duration_ms,
+            'stages': stages,
+            'collscan': collscan,
+            'suggested_index': suggested,
+            'error': error,
+            'created': datetime.now(timezone.utc)
+        })
+
+    def stats(self):
+        with self._lock:
+            return {shape: dict(stats) for shape, stats in self.shapes.items()}
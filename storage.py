@@ -0,0 +1,349 @@
+import hashlib
+import heapq
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from pymongo import ReturnDocument
+from werkzeug.exceptions import RequestEntityTooLarge, UnsupportedMediaType
+
+CHUNK_SIZE = 64 * 1024
+
+# 확장자별 파일 시작 바이트(magic bytes) 검사 / 목록에 없는 확장자(txt 등)는 검사하지 않음
+MAGIC_CHECKS = {
+    'png': lambda head: head.startswith(b'\x89PNG\r\n\x1a\n'),
+    'jpg': lambda head: head.startswith(b'\xff\xd8\xff'),
+    'jpeg': lambda head: head.startswith(b'\xff\xd8\xff'),
+    'gif': lambda head: head[:6] in (b'GIF87a', b'GIF89a'),
+    'pdf': lambda head: head.startswith(b'%PDF'),
+    'mp3': lambda head: head.startswith(b'ID3') or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0),
+    'wav': lambda head: head[:4] == b'RIFF' and head[8:12] == b'WAVE',
+    'mp4': lambda head: head[4:8] == b'ftyp',
+}
+SNIFF_BYTES = 12
+
+
+class IngestStream:
+    """multipart 파싱 중에 업로드 파일을 업로드 폴더의 임시 파일에 바로 쓰는 스트림.
+
+    쓰면서 sha256을 계산하고, 앞부분으로 파일 형식을 확인하고, 크기 제한을 넘으면 바로 중단한다.
+    저장이 확정되면 commit()으로 최종 이름으로 옮기고(같은 파일시스템이므로 rename만), 아니면 close() 때 삭제한다.
+    """
+
+    def __init__(self, upload_folder, ext, max_size):
+        self.ext = ext
+        self.max_size = max_size
+        self.size = 0
+        self.digest = hashlib.sha256()
+        self.committed = False
+        self._head = b''
+        self._checked = ext not in MAGIC_CHECKS
+        os.makedirs(upload_folder, exist_ok=True)
+        self.path = os.path.join(upload_folder, f'.tmp-{uuid.uuid4().hex}')
+        self._file = open(self.path, 'w+b')
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            self.close()
+            raise RequestEntityTooLarge(f'.{self.ext} 파일은 {self.max_size // (1024 * 1024)}MB까지 올릴 수 있습니다.')
+        if not self._checked:
+            self._head = (self._head + data)[:SNIFF_BYTES]
+            if len(self._head) >= SNIFF_BYTES:
+                self._check()
+        self.digest.update(data)
+        return self._file.write(data)
+
+    def _check(self):
+        self._checked = True
+        if not MAGIC_CHECKS[self.ext](self._head):
+            self.close()
+            raise UnsupportedMediaType(f'파일 내용이 .{self.ext} 형식이 아닙니다.')
+
+    def seek(self, pos, whence=0):
+        # 파트가 끝나면 파서가 seek(0)을 호출함 -> SNIFF_BYTES보다 작은 파일도 여기서 검사
+        if not self._checked:
+            self._check()
+        return self._file.seek(pos, whence)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def tell(self):
+        return self._file.tell()
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+    def commit(self, final_path):
+        self._file.close()
+        if os.path.exists(final_path):
+            os.remove(self.path)  # 이미 같은 내용의 파일이 있음
+        else:
+            os.replace(self.path, final_path)
+        self.committed = True
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class DiscardStream:
+    # 허용되지 않은 확장자나 빈 파일 입력은 디스크에 쓰지 않고 버림
+
+    def write(self, data):
+        return len(data)
+
+    def seek(self, pos, whence=0):
+        return 0
+
+    def read(self, size=-1):
+        return b''
+
+    def tell(self):
+        return 0
+
+    def close(self):
+        pass
+
+
+def open_upload_stream(upload_folder, filename, max_sizes, allowed_extensions, default_max_size=5 * 1024 * 1024):
+    ext = filename.rsplit('.', 1)[1].lower() if filename and '.' in filename else ''
+    if ext not in allowed_extensions:
+        return DiscardStream()
+    return IngestStream(upload_folder, ext, max_sizes.get(ext, default_max_size))
+
+
+class UploadStore:
+    """업로드 파일을 내용 해시(sha256)로 이름 붙여 한 번만 저장하는 저장소.
+
+    같은 파일이 여러 번 올라오면 파일은 하나만 두고 Mongo에 참조 수(refs)만 늘린다.
+    release()로 참조 수가 0이 되면 파일을 지운다.
+
+    save()는 항상 참조 수를 먼저 늘린 뒤 파일이 없으면 놓는다. release()는 문서에 삭제 표시(deleting)를 한 쪽만
+    파일을 옆으로 옮기고, 그때도 참조 수가 0일 때만 문서를 지운다. 그 사이 save()가 참조 수를 늘렸으면
+    옮긴 파일을 되돌리므로, 삭제와 저장이 겹쳐도 참조 중인 파일이 사라지지 않는다.
+    """
+
+    def __init__(self, upload_folder, collection, claim_seconds=60):
+        self.upload_folder = upload_folder
+        self.collection = collection  # {'_id': '<sha256>.<ext>', 'refs': n, 'size': bytes, ('deleting', 'deleting_at')}
+        self.claim_seconds = claim_seconds  # 삭제하던 프로세스가 죽어서 남은 삭제 표시는 이 시간 뒤 무시
+
+    def path(self, file_url):
+        return os.path.join(self.upload_folder, os.path.basename(file_url))
+
+    def save(self, file, ext):
+        # 임시 파일에 쓰면서 해시 계산 -> 같은 이름으로 옮김 / 반환값은 'uploads/<이름>' (기존 file_url 형식)
+        stream = getattr(file, 'stream', None)
+        if isinstance(stream, IngestStream):
+            # 요청을 받으면서 이미 업로드 폴더에 쓰고 해시도 계산해 둠 -> 이름만 바꿈
+            filename = f'{stream.hexdigest()}.{ext}'
+            self.collection.update_one(
+                {'_id': filename},
+                {'$inc': {'refs': 1}, '$setOnInsert': {'size': stream.size}},
+                upsert=True
+            )
+            stream.commit(os.path.join(self.upload_folder, filename))
+            return f'uploads/{filename}'
+
+        os.makedirs(self.upload_folder, exist_ok=True)
+        tmp_path = os.path.join(self.upload_folder, f'.tmp-{uuid.uuid4().hex}')
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(tmp_path, 'wb') as out:
+                while True:
+                    chunk = file.stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size += len(chunk)
+
+            filename = f'{digest.hexdigest()}.{ext}'
+            self.collection.update_one(
+                {'_id': filename},
+                {'$inc': {'refs': 1}, '$setOnInsert': {'size': size}},
+                upsert=True
+            )
+            final_path = os.path.join(self.upload_folder, filename)
+            if os.path.exists(final_path):
+                os.remove(tmp_path)  # 이미 같은 내용의 파일이 있음
+            else:
+                os.replace(tmp_path, final_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return f'uploads/{filename}'
+
+    def release(self, file_url):
+        # 참조 수를 하나 줄이고 0이 되면 파일 삭제
+        if not file_url:
+            return
+        filename = os.path.basename(file_url)
+        blob = self.collection.find_one_and_update(
+            {'_id': filename},
+            {'$inc': {'refs': -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob is None:
+            # blob 문서가 없는 예전(uuid 이름) 파일은 바로 삭제
+            path = self.path(filename)
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        if blob['refs'] > 0:
+            return
+        self._delete(filename)
+
+    def _delete(self, filename):
+        # 삭제 표시를 먼저 남긴 한 프로세스만 진행 (그 사이 다시 참조되었으면 표시하지 않음)
+        claim = uuid.uuid4().hex
+        now = datetime.now(timezone.utc)
+        claimed = self.collection.update_one(
+            {'_id': filename, 'refs': {'$lte': 0}, '$or': [
+                {'deleting': {'$exists': False}},
+                {'deleting_at': {'$lt': now - timedelta(seconds=self.claim_seconds)}}
+            ]},
+            {'$set': {'deleting': claim, 'deleting_at': now}}
+        )
+        if claimed.modified_count == 0:
+            return
+
+        # 파일을 옆으로 옮긴 뒤 문서 삭제 -> 이후의 save()는 파일이 없으므로 새로 놓음
+        path = self.path(filename)
+        aside = os.path.join(self.upload_folder, f'.tmp-del-{claim}')
+        try:
+            os.replace(path, aside)
+        except FileNotFoundError:
+            aside = None
+        if self.collection.delete_one({'_id': filename, 'deleting': claim, 'refs': {'$lte': 0}}).deleted_count:
+            if aside:
+                os.remove(aside)
+            return
+
+        # 그 사이 save()가 참조 수를 늘림 -> 파일을 되돌리고 (이미 새로 놓았으면 옮긴 쪽을 버림) 삭제 표시 해제
+        if aside:
+            if os.path.exists(path):
+                os.remove(aside)
+            else:
+                os.replace(aside, path)
+        self.collection.update_one({'_id': filename, 'deleting': claim},
+                                   {'$unset': {'deleting': '', 'deleting_at': ''}})
+
+
+class OrphanCollector:
+    """어디에서도 참조하지 않는 업로드 파일을 조금씩 정리하는 GC.
+
+    한 번의 run_batch()는 업로드 폴더에서 이름순으로 batch_size 개만 확인하고 다음 위치를 state에 저장한다.
+    참조가 없는 파일은 바로 지우지 않고 quarantine 폴더로 옮겨 두었다가,
+    quarantine_seconds 가 지나도 여전히 참조가 없으면 삭제한다. (그 사이 다시 참조되면 되돌려 놓음)
+    find_referenced(file_urls)는 그 중 DB에서 참조 중인 file_url 집합을 반환해야 한다.
+    """
+
+    def __init__(self, store, quarantine_folder, find_referenced, state_collection,
+                 grace_seconds=3600, quarantine_seconds=7 * 24 * 3600):
+        self.store = store
+        self.quarantine_folder = quarantine_folder
+        self.find_referenced = find_referenced
+        self.state_collection = state_collection  # {'_id': 'upload_gc', 'cursor': 마지막으로 확인한 파일 이름}
+        self.grace_seconds = grace_seconds  # 막 올라와서 아직 쪽지/프로필에 연결되기 전인 파일은 건너뜀
+        self.quarantine_seconds = quarantine_seconds
+
+    def _next_names(self, folder, cursor, batch_size):
+        # 폴더 전체를 정렬하지 않고 cursor 다음 이름 batch_size 개만 고름
+        try:
+            names = (entry.name for entry in os.scandir(folder) if entry.is_file() and entry.name > cursor)
+            return heapq.nsmallest(batch_size, names)
+        except FileNotFoundError:
+            return []
+
+    def run_batch(self, batch_size=500, dry_run=False):
+        start = time.monotonic()
+        now = time.time()
+        report = {'scanned': 0, 'quarantined': 0, 'restored': 0, 'deleted': 0, 'bytes_reclaimed': 0, 'done': False}
+
+        state = self.state_collection.find_one({'_id': 'upload_gc'}) or {}
+        cursor = state.get('cursor', '')
+        names = self._next_names(self.store.upload_folder, cursor, batch_size)
+        report['scanned'] = len(names)
+
+        candidates = []
+        for name in names:
+            path = os.path.join(self.store.upload_folder, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime < self.grace_seconds:
+                continue
+            if name.startswith('.'):
+                # 요청이 중간에 끊겨 남은 임시 파일은 참조될 수 없으므로 바로 삭제
+                if name.startswith('.tmp-'):
+                    if not dry_run:
+                        self._remove(path)
+                    report['deleted'] += 1
+                    report['bytes_reclaimed'] += stat.st_size
+                continue
+            candidates.append(name)
+
+        referenced = self.find_referenced([f'uploads/{name}' for name in candidates]) if candidates else set()
+        for name in candidates:
+            if f'uploads/{name}' in referenced:
+                continue
+            report['quarantined'] += 1
+            if not dry_run:
+                os.makedirs(self.quarantine_folder, exist_ok=True)
+                quarantine_path = os.path.join(self.quarantine_folder, name)
+                os.replace(os.path.join(self.store.upload_folder, name), quarantine_path)
+                os.utime(quarantine_path)  # 격리한 시각부터 보관 기간 계산
+
+        self._sweep_quarantine(now, report, dry_run)
+
+        # 끝까지 확인했으면 처음부터 다시
+        report['done'] = len(names) < batch_size
+        if not dry_run:
+            next_cursor = '' if report['done'] else names[-1]
+            self.state_collection.update_one({'_id': 'upload_gc'}, {'$set': {'cursor': next_cursor}}, upsert=True)
+        report['seconds'] = time.monotonic() - start
+        return report
+
+    def _sweep_quarantine(self, now, report, dry_run):
+        # 보관 기간이 지난 격리 파일 삭제 (그 사이 다시 참조되었으면 업로드 폴더로 되돌림)
+        try:
+            entries = [entry for entry in os.scandir(self.quarantine_folder) if entry.is_file()]
+        except FileNotFoundError:
+            return
+        expired = [entry for entry in entries if now - entry.stat().st_mtime >= self.quarantine_seconds]
+        if not expired:
+            return
+        referenced = self.find_referenced([f'uploads/{entry.name}' for entry in expired])
+        for entry in expired:
+            upload_path = os.path.join(self.store.upload_folder, entry.name)
+            if f'uploads/{entry.name}' in referenced:
+                if not dry_run:
+                    if os.path.exists(upload_path):
+                        self._remove(entry.path)  # 같은 내용이 다시 올라와서 이미 있음
+                    else:
+                        os.replace(entry.path, upload_path)
+                report['restored'] += 1
+                continue
+            size = entry.stat().st_size
+            if not dry_run:
+                if not os.path.exists(upload_path):
+                    # 참조 수가 남아 있던(실패한 요청 등) blob 문서도 정리
+                    self.store.collection.delete_one({'_id': entry.name})
+                self._remove(entry.path)
+            report['deleted'] += 1
+            report['bytes_reclaimed'] += size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,66 @@
+import os
+import sys
+
+import mongomock
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# app.py 는 import 할 때 설정을 읽으므로 먼저 정함 (.env 보다 우선)
+os.environ.update({
+    'SECRET_KEY': 'test-secret-key-for-pytest-0123456789',
+    'MONGODB_URI': 'mongodb://localhost:27017',
+    'MONGO_DBNAME': 'rollingpaper_test',
+    'SLOW_QUERY_MS': '1000000',  # 테스트 중에는 explain 을 실행하지 않도록
+    'BOARD_CACHE_BACKEND': 'memory',
+    'EVENTS_BROKER': 'memory',
+    'XY_FLUSH_INTERVAL': '0',  # 좌표는 버퍼 없이 바로 저장
+    'JOB_WORKERS': '0',  # 작업은 테스트에서 job_queue.run_one() 으로 직접 실행
+    'ASSET_FINGERPRINT': '0',
+})
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    # mongod 없이 mongomock 으로 (mongo.py 는 import 할 때 MongoClient 를 가져가므로 먼저 바꿔 둠)
+    import pymongo
+    pymongo.MongoClient = mongomock.MongoClient
+    import mongo
+    mongo.MongoClient = mongomock.MongoClient
+    import app as app_module
+    return app_module
+
+
+@pytest.fixture
+def app(app_module, tmp_path):
+    # 테스트마다 빈 DB / 빈 캐시 / 임시 업로드 폴더에서 시작
+    for name in app_module.db.list_collection_names():
+        app_module.db[name].drop()
+    for cache in (app_module.user_cache, app_module.board_cache, app_module.users_page_cache):
+        cache.clear()
+    upload_folder = str(tmp_path / 'uploads')
+    app_module.app.config['UPLOAD_FOLDER'] = upload_folder
+    app_module.upload_store.upload_folder = upload_folder
+    return app_module
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(username, name=None, nickname=None):
+        return app.user_repository.create(username, 'password', name or username, nickname or username)
+    return make_user
+
+
+@pytest.fixture
+def client(app, make_user):
+    # 'owner' 로 로그인한 테스트 클라이언트
+    client = app.app.test_client()
+    client.user = make_user('owner')
+    client.set_cookie('token', app.create_jwt_token(client.user._id, client.user))
+    return client
@@ -0,0 +1,74 @@
+import gzip
+import hashlib
+import os
+
+import pytest
+
+from assets import AssetManifest
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_manifest_names_files_by_content_hash(tmp_path):
+    static = tmp_path / 'static'
+    write(str(static / 'css' / 'site.css'), b'body { color: red }')
+    write(str(static / 'logo.png'), b'\x89PNG')
+    write(str(static / 'uploads' / 'note.png'), b'upload')
+    write(str(static / '.hidden'), b'hidden')
+    manifest = AssetManifest(str(static), str(tmp_path / 'cache')).build()
+
+    digest = hashlib.sha256(b'body { color: red }').hexdigest()[:12]
+    logo = hashlib.sha256(b'\x89PNG').hexdigest()[:12]
+    assert manifest.hashed == {
+        'css/site.css': f'css/site.{digest}.css',
+        'logo.png': f'logo.{logo}.png',
+    }
+    assert manifest.original[f'css/site.{digest}.css'] == ('css/site.css', digest)
+    # 압축할 만한 파일만 미리 gzip
+    assert list(manifest.gzipped) == [f'css/site.{digest}.css']
+    with gzip.open(manifest.gzipped[f'css/site.{digest}.css']) as f:
+        assert f.read() == b'body { color: red }'
+
+    values = {'filename': 'css/site.css'}
+    manifest.url_defaults('static', values)
+    assert values == {'filename': f'css/site.{digest}.css'}
+
+
+def test_changed_file_gets_a_new_name(tmp_path):
+    static = tmp_path / 'static'
+    write(str(static / 'app.js'), b'one')
+    first = AssetManifest(str(static), str(tmp_path / 'cache')).build().hashed['app.js']
+    write(str(static / 'app.js'), b'two')
+    assert AssetManifest(str(static), str(tmp_path / 'cache')).build().hashed['app.js'] != first
+
+
+@pytest.fixture
+def assets(app, tmp_path, monkeypatch):
+    manifest = AssetManifest(app.app.static_folder, str(tmp_path / 'asset_cache')).build()
+    monkeypatch.setattr(app, 'asset_manifest', manifest)
+    return manifest
+
+
+def test_hashed_asset_is_served_immutable(app, assets):
+    hashed = assets.hashed['script.js']
+    with open(os.path.join(app.app.static_folder, 'script.js'), 'rb') as f:
+        original = f.read()
+    client = app.app.test_client()
+
+    response = client.get(f'/static/{hashed}', headers={'Accept-Encoding': 'identity'})
+    assert response.status_code == 200
+    assert response.data == original
+    assert response.cache_control.immutable
+    assert response.get_etag() == (assets.original[hashed][1], False)
+
+    zipped = client.get(f'/static/{hashed}', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.content_encoding == 'gzip'
+    assert gzip.decompress(zipped.data) == original
+    assert 'Accept-Encoding' in zipped.vary
+
+    # 해시가 없는 원래 이름도 그대로 받을 수 있음
+    assert client.get('/static/script.js').status_code == 200
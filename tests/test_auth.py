@@ -0,0 +1,57 @@
+import pytest
+
+from repository import Message
+
+
+@pytest.fixture
+def refresh_client(app, client):
+    # refresh 토큰을 access 토큰 쿠키에 넣은 클라이언트
+    client.set_cookie('token', app.create_refresh_token(client.user))
+    return client
+
+
+def test_access_token_is_accepted(client):
+    response = client.get(f'/paper/{client.user._id}/changes')
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('method, path', [
+    ('get', '/paper/{board}/changes'),
+    ('get', '/paper/{board}/notes'),
+    ('get', '/paper/{board}'),
+    ('post', '/xy_update'),
+])
+def test_refresh_token_is_not_an_access_token(refresh_client, method, path):
+    response = getattr(refresh_client, method)(path.format(board=refresh_client.user._id), json={'moves': []})
+    assert response.status_code == 401
+
+
+def test_refresh_token_cannot_delete_notes(app, refresh_client):
+    note = app.message_repository.insert(Message(content='note', recipient_id=str(refresh_client.user._id),
+                                                 newx=0, newy=0))
+    response = refresh_client.post(f'/delete_message/{note._id}/{refresh_client.user._id}')
+    assert response.status_code == 401
+    assert app.message_repository.get(note._id) is not None
+
+
+def test_refresh_token_does_not_identify_the_user(app, refresh_client):
+    with app.app.test_request_context(headers={'Cookie': f"token={app.create_refresh_token(refresh_client.user)}"}):
+        assert app.current_user_id() is None
+
+
+def test_profile_edit_keeps_the_fresh_token_after_refresh(app, client, monkeypatch):
+    # claims 모드에서 access 토큰이 만료되어 같은 요청에서 재발급된 뒤 프로필을 바꾼 경우
+    monkeypatch.setitem(app.app.config, 'AUTH_MODE', 'claims')
+    monkeypatch.setitem(app.app.config, 'ACCESS_TOKEN_MINUTES', -1)
+    client.set_cookie('token', app.create_jwt_token(client.user._id, client.user))
+    client.set_cookie('refresh_token', app.create_refresh_token(client.user))
+    monkeypatch.setitem(app.app.config, 'ACCESS_TOKEN_MINUTES', 15)
+
+    response = client.post('/edit_profile', data={'name': 'owner', 'nickname': 'renamed'})
+
+    tokens = [header for header in response.headers.getlist('Set-Cookie') if header.startswith('token=')]
+    assert len(tokens) == 1
+    payload = app.decode_access_token(client.get_cookie('token').value)
+    assert payload['nickname'] == 'renamed'
+    assert payload['ver'] == app.user_repository.get(client.user._id).token_version
+    assert client.get(f'/paper/{client.user._id}/changes').status_code == 200
@@ -0,0 +1,76 @@
+import threading
+
+import background
+from background import BackgroundThread
+
+
+def test_threads_started_once_and_dead_ones_respawned():
+    stop = threading.Event()
+    runs = []
+
+    def target():
+        runs.append(threading.current_thread().name)
+        stop.wait()
+
+    workers = BackgroundThread(target, 'worker', count=2)
+    workers.ensure()
+    workers.ensure()
+    assert workers.alive()
+    first = list(workers._threads)
+
+    # 하나가 죽으면 그 스레드만 다시 띄움
+    dead = threading.Thread(target=lambda: None)
+    dead.start()
+    dead.join()
+    workers._threads[1] = dead
+    workers.ensure()
+    assert workers._threads[0] is first[0]
+    assert workers._threads[1] is not dead and workers._threads[1].is_alive()
+    stop.set()
+    for thread in first + workers._threads:
+        thread.join(1)
+    assert sorted(runs) == ['worker-0', 'worker-1', 'worker-1']
+
+
+def test_threads_respawned_after_fork(monkeypatch):
+    stop = threading.Event()
+    thread = BackgroundThread(stop.wait, 'single')
+    thread.ensure()
+    parent = thread._threads[0]
+    assert parent.name == 'single'
+
+    # fork 된 자식 프로세스에서는 부모의 스레드가 살아 있어도 새로 띄움
+    monkeypatch.setattr(background.os, 'getpid', lambda: -1)
+    assert not thread.alive()
+    thread.ensure()
+    assert thread._threads[0] is not parent
+    stop.set()
+
+
+def test_concurrent_ensure(monkeypatch):
+    # 첫 요청이 동시에 들어와서 여러 스레드가 한꺼번에 ensure() 를 부르는 경우
+    stop = threading.Event()
+    errors = []
+    for trial in range(50):
+        workers = BackgroundThread(stop.wait, 'worker', count=4)
+        monkeypatch.setattr(background.os, 'getpid', lambda: -1)
+        workers.ensure()
+        monkeypatch.setattr(background.os, 'getpid', lambda: trial)  # fork 뒤
+        barrier = threading.Barrier(8)
+
+        def call():
+            barrier.wait()
+            try:
+                workers.ensure()
+            except Exception as e:
+                errors.append(e)
+
+        callers = [threading.Thread(target=call) for _ in range(8)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+        assert workers.alive()
+        assert len(workers._threads) == 4
+    stop.set()
+    assert errors == []
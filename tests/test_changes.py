@@ -0,0 +1,103 @@
+import io
+
+
+def post_note(client, recipient_id, content='hello'):
+    return client.post('/message', data={
+        'recipient_id': str(recipient_id), 'content': content, 'theme': 'yellow', 'file': (io.BytesIO(b''), '')
+    }, content_type='multipart/form-data')
+
+
+def changes(client, board_id, since=None):
+    query = {} if since is None else {'since': since}
+    return client.get(f'/paper/{board_id}/changes', query_string=query).get_json()
+
+
+def test_changes_report_created_moved_and_deleted_notes(client, app):
+    board_id = client.user._id
+    start = changes(client, board_id)
+    assert start['reset'] is True
+
+    post_note(client, board_id)
+    created = changes(client, board_id, start['rev'])
+    assert created['reset'] is False
+    assert created['more'] is False
+    [note] = created['changed']
+    assert (note['x'], note['y']) == (0, 0)
+
+    client.post('/xy_update', json={'recipient': str(board_id), 'moves': [{'id': note['id'], 'newX': 40, 'newY': 70}]})
+    moved = changes(client, board_id, created['rev'])
+    assert [(change['id'], change['x'], change['y']) for change in moved['changed']] == [(note['id'], 40, 70)]
+
+    client.post(f"/delete_message/{note['id']}/{board_id}")
+    deleted = changes(client, board_id, moved['rev'])
+    assert deleted['changed'] == []
+    assert deleted['deleted'] == [note['id']]
+    assert changes(client, board_id, deleted['rev'])['changed'] == []
+
+
+def test_changes_only_for_requested_board(client, make_user):
+    other = make_user('other')
+    start = changes(client, client.user._id)
+    post_note(client, other._id)
+
+    assert changes(client, client.user._id, start['rev'])['changed'] == []
+    assert len(changes(client, other._id, start['rev'])['changed']) == 1
+
+
+def test_changes_require_login(app):
+    response = app.app.test_client().get('/paper/abc/changes')
+    assert response.status_code == 401
+
+
+def test_more_when_one_source_is_full(client, app, monkeypatch):
+    board_id = client.user._id
+    monkeypatch.setattr(app, 'CHANGES_LIMIT', 2)
+    since = changes(client, board_id)['rev']
+    for i in range(3):
+        post_note(client, board_id, f'note {i}')
+    notes = [str(message._id) for message in app.message_repository.changed_since(str(board_id), since, 10)]
+
+    # 쪽지 목록만 제한(2개)을 채우고 삭제 기록은 없어도 뒤에 더 있으므로 more
+    page = changes(client, board_id, since)
+    assert [note['id'] for note in page['changed']] == notes[:2]
+    assert page['more'] is True
+
+    client.post(f'/delete_message/{notes[0]}/{board_id}')
+    seen_changed, seen_deleted, rev = [], [], page['rev']
+    while True:
+        page = changes(client, board_id, rev)
+        seen_changed += [note['id'] for note in page['changed']]
+        seen_deleted += page['deleted']
+        rev = page['rev']
+        if not page['more']:
+            break
+    assert seen_changed == notes[2:]
+    assert seen_deleted == [notes[0]]
+
+
+def test_changes_wait_for_revisions_in_flight(client, app):
+    board_id = client.user._id
+    since = changes(client, board_id)['rev']
+
+    # 먼저 번호를 받은 쓰기가 끝나기 전에 뒤 번호의 쪽지가 저장된 경우
+    with app.revisions.allocate():
+        post_note(client, board_id)
+        pending = changes(client, board_id, since)
+        assert pending['changed'] == []
+        assert pending['rev'] == since
+    done = changes(client, board_id, pending['rev'])
+    assert len(done['changed']) == 1
+
+
+def test_rename_is_reported_as_a_change(client, app):
+    board_id = client.user._id
+    post_note(client, board_id)
+    since = changes(client, board_id)['rev']
+
+    client.post('/edit_profile', data={'name': 'owner', 'nickname': 'renamed'})
+    assert app.job_queue.run_one()  # sync_profile
+
+    page = changes(client, board_id, since)
+    [note] = page['changed']
+    assert 'renamed' in note['html']
+    assert page['rev'] > since
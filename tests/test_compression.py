@@ -0,0 +1,85 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+from compression import gzip_response
+
+PAGE = '<p>' + 'rolling paper ' * 200 + '</p>'
+
+
+@pytest.fixture
+def web():
+    app = Flask(__name__)
+    app.after_request(lambda response: gzip_response(response, min_size=100))
+    return app
+
+
+def test_large_html_is_gzipped(web):
+    web.route('/')(lambda: (PAGE, {'ETag': '"v1"'}))
+    response = web.test_client().get('/', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.content_encoding == 'gzip'
+    assert gzip.decompress(response.data).decode() == PAGE
+    assert 'Accept-Encoding' in response.vary
+    assert response.get_etag() == ('v1', True)  # 압축하면 약한 ETag
+
+
+@pytest.mark.parametrize('body, headers, accept', [
+    ('<p>small</p>', {}, 'gzip'),  # min_size 보다 작음
+    (PAGE, {'Content-Encoding': 'br'}, 'gzip, br'),  # 이미 압축됨
+    (PAGE, {'Content-Type': 'application/json'}, 'gzip'),  # HTML 아님
+    (PAGE, {}, 'identity'),  # 클라이언트가 gzip 을 받지 않음
+])
+def test_skipped_responses_are_sent_as_is(web, body, headers, accept):
+    web.route('/')(lambda: (body, headers))
+    response = web.test_client().get('/', headers={'Accept-Encoding': accept})
+
+    assert response.content_encoding == headers.get('Content-Encoding')
+    assert response.get_data(as_text=True) == body
+
+
+def test_streamed_html_is_compressed_chunk_by_chunk(web):
+    rendered = []
+
+    def render():
+        for i in range(40):
+            rendered.append(i)
+            yield f'<p>{i}</p>' + 'x' * 1024
+
+    with web.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = gzip_response(web.response_class(render(), mimetype='text/html'), min_size=100)
+        assert response.content_encoding == 'gzip'
+        assert 'Content-Length' not in response.headers
+        chunks = iter(response.response)
+        first = next(chunks)
+        # 전체를 렌더링하기 전에 앞부분이 먼저 나감
+        assert len(rendered) < 40
+        body = gzip.decompress(first + b''.join(chunks)).decode()
+    assert body == ''.join(f'<p>{i}</p>' + 'x' * 1024 for i in range(40))
+
+
+def test_small_streamed_html_is_not_compressed(web):
+    with web.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = gzip_response(web.response_class(iter(['<p>', 'small', '</p>']), mimetype='text/html'),
+                                 min_size=100)
+        assert response.content_encoding is None
+        assert response.get_data(as_text=True) == '<p>small</p>'
+
+
+def test_stream_closed_when_client_disconnects(web):
+    closed = []
+
+    def render():
+        try:
+            while True:
+                yield 'x' * 1024
+        finally:
+            closed.append(True)
+
+    with web.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+        response = gzip_response(web.response_class(render(), mimetype='text/html'), min_size=100)
+        chunks = iter(response.response)
+        next(chunks)
+        chunks.close()
+    assert closed == [True]
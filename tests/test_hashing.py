@@ -0,0 +1,60 @@
+import importlib.util
+import os
+import sys
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+# UI/hashing.py (UI 폴더를 sys.path 에 넣으면 UI/app.py 가 메인 app 대신 import 되므로 파일로 불러옴)
+spec = importlib.util.spec_from_file_location(
+    'hashing', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'UI', 'hashing.py'))
+hashing = sys.modules['hashing'] = importlib.util.module_from_spec(spec)  # 풀 워커에서 함수를 찾을 수 있도록 등록
+spec.loader.exec_module(hashing)
+HasherBusy, PasswordHasher = hashing.HasherBusy, hashing.PasswordHasher
+
+
+def wait_idle(hasher, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while hasher.stats()['inflight'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return hasher.stats()['inflight']
+
+
+def test_hash_and_check():
+    hasher = PasswordHasher(max_workers=1, rounds=4)
+    try:
+        pw_hash = hasher.generate_password_hash('secret')
+        assert hasher.check_password_hash(pw_hash, 'secret')
+        assert not hasher.check_password_hash(pw_hash, 'wrong')
+        assert wait_idle(hasher) == 0
+    finally:
+        hasher._executor.shutdown()
+
+
+def test_timed_out_job_counts_until_it_finishes():
+    hasher = PasswordHasher(max_workers=1, max_queue=0, timeout=0.05)
+    try:
+        with pytest.raises(HasherBusy):
+            hasher._run(time.sleep, 0.5)
+        # 응답은 먼저 했어도 풀에서는 아직 실행 중 -> 새 작업은 받지 않음
+        assert hasher.stats()['inflight'] == 1
+        with pytest.raises(HasherBusy):
+            hasher._run(abs, -3)
+
+        assert wait_idle(hasher) == 0
+        assert hasher._run(abs, -3) == 3
+    finally:
+        hasher._executor.shutdown()
+
+
+def test_timed_out_job_is_cancelled():
+    hasher = PasswordHasher(timeout=0.01)
+    future = Future()  # 풀에서 아직 시작하지 않은 작업
+    hasher._get_executor = lambda: SimpleNamespace(submit=lambda fn, *args: future)
+
+    with pytest.raises(HasherBusy):
+        hasher._run(abs, -3)
+    assert future.cancelled()
+    assert hasher.stats()['inflight'] == 0
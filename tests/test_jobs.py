@@ -0,0 +1,149 @@
+from datetime import datetime, timedelta, timezone
+
+from jobs import JobQueue
+
+
+def make_due(db, job_id):
+    # 다시 시도하기까지 기다리는 시간을 건너뜀
+    db['jobs'].update_one({'_id': job_id}, {'$set': {'run_at': datetime.now(timezone.utc)}})
+
+
+def test_failed_job_resumes_from_checkpoint(db):
+    queue = JobQueue(db['jobs'], workers=0)
+    started = []
+
+    def count(job, checkpoint):
+        done = job['progress'].get('done', 0)
+        started.append(done)
+        for i in range(done, 4):
+            checkpoint({'done': i + 1})
+            if i == 1 and len(started) == 1:
+                raise RuntimeError('interrupted')
+
+    queue.register('count', count)
+    job_id = queue.enqueue('count', {})
+
+    assert queue.run_one()
+    job = db['jobs'].find_one({'_id': job_id})
+    assert job['state'] == 'pending'
+    assert job['progress'] == {'done': 2}
+    assert job['error'] == 'interrupted'
+
+    make_due(db, job_id)
+    assert queue.run_one()
+    job = db['jobs'].find_one({'_id': job_id})
+    assert started == [0, 2]
+    assert job['state'] == 'done'
+    assert job['progress'] == {'done': 4}
+    assert job['attempts'] == 2
+
+
+def test_expired_lease_is_taken_over(db):
+    queue = JobQueue(db['jobs'], workers=0)
+    resumed = []
+    queue.register('resume', lambda job, checkpoint: resumed.append(job['progress']))
+    job_id = queue.enqueue('resume', {})
+
+    # checkpoint 후 워커 프로세스가 죽어서 running 으로 남은 작업
+    db['jobs'].update_one({'_id': job_id}, {'$set': {
+        'state': 'running', 'attempts': 1, 'progress': {'done': 3},
+        'lease_until': datetime.now(timezone.utc) + timedelta(seconds=60)
+    }})
+    assert not queue.run_one()  # 점유 시간이 남아 있으면 가져가지 않음
+
+    db['jobs'].update_one({'_id': job_id}, {'$set': {'lease_until': datetime.now(timezone.utc) - timedelta(seconds=1)}})
+    assert queue.run_one()
+    assert resumed == [{'done': 3}]
+    job = db['jobs'].find_one({'_id': job_id})
+    assert job['state'] == 'done'
+    assert job['attempts'] == 2
+
+
+def test_job_fails_after_max_attempts(db):
+    queue = JobQueue(db['jobs'], workers=0, max_attempts=2)
+
+    def broken(job, checkpoint):
+        raise RuntimeError('broken')
+
+    queue.register('broken', broken)
+    job_id = queue.enqueue('broken', {})
+    assert queue.run_one()
+    make_due(db, job_id)
+    assert queue.run_one()
+
+    job = db['jobs'].find_one({'_id': job_id})
+    assert job['state'] == 'failed'
+    assert job['error'] == 'broken'
+    assert not queue.run_one()
+
+
+def test_delete_account_job_resumes_after_failure(app, make_user, monkeypatch):
+    owner = make_user('owner')
+    friend = make_user('friend')
+    for i in range(3):
+        app.message_repository.insert(app.Message(content=f'note {i}', recipient_id=str(friend._id), author='owner',
+                                                  author_id=owner._id, newx=0, newy=i, rev=i + 1))
+    monkeypatch.setitem(app.app.config, 'DELETE_BATCH_SIZE', 2)
+
+    # 두 번째 배치를 지우다가 실패
+    delete_many = app.message_repository.delete_many
+    calls = []
+
+    def flaky_delete_many(message_ids):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError('connection lost')
+        return delete_many(message_ids)
+
+    monkeypatch.setattr(app.message_repository, 'delete_many', flaky_delete_many)
+    job_id = app.job_queue.enqueue('delete_account', {
+        'user_id': str(owner._id), 'nickname': owner.nickname, 'profile_picture': None
+    })
+
+    assert app.job_queue.run_one()
+    job = app.db['jobs'].find_one({'_id': job_id})
+    assert job['state'] == 'pending'
+    assert job['progress'] == {'messages': 2}
+
+    make_due(app.db, job_id)
+    assert app.job_queue.run_one()
+    job = app.db['jobs'].find_one({'_id': job_id})
+    assert job['state'] == 'done'
+    assert job['progress'] == {'messages': 3, 'profile_picture': True}
+    assert list(app.message_repository.for_board(str(friend._id))) == []
+
+
+
+def take_over(db, job_id):
+    # 점유 시간이 지나 다른 워커가 같은 작업을 다시 가져감
+    db['jobs'].update_one({'_id': job_id}, {'$set': {'lease': 'other-worker'}, '$inc': {'attempts': 1}})
+
+
+def test_worker_that_lost_its_lease_does_not_finish_the_job(db):
+    queue = JobQueue(db['jobs'], workers=0)
+    queue.register('slow', lambda job, checkpoint: take_over(db, job['_id']))
+    job_id = queue.enqueue('slow', {})
+
+    assert queue.run_one()
+    job = db['jobs'].find_one({'_id': job_id})
+    assert job['state'] == 'running'
+    assert job['lease'] == 'other-worker'
+
+
+def test_worker_that_lost_its_lease_stops_at_checkpoint(db):
+    queue = JobQueue(db['jobs'], workers=0, max_attempts=1)
+    steps = []
+
+    def slow(job, checkpoint):
+        take_over(db, job['_id'])
+        checkpoint({'done': 1})
+        steps.append('after checkpoint')
+
+    queue.register('slow', slow)
+    job_id = queue.enqueue('slow', {})
+
+    assert queue.run_one()
+    job = db['jobs'].find_one({'_id': job_id})
+    assert steps == []
+    assert job['progress'] == {}
+    assert (job['state'], job['error']) == ('running', None)  # 실패로 바꾸지도 않음
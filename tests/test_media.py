@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+DATA = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def media(app):
+    folder = app.app.config['UPLOAD_FOLDER']
+    os.makedirs(folder)
+    with open(os.path.join(folder, 'abc123.mp3'), 'wb') as f:
+        f.write(DATA)
+    return app.app.test_client()
+
+
+def test_file_is_served_with_a_strong_etag(media):
+    response = media.get('/media/abc123.mp3')
+
+    assert response.status_code == 200
+    assert response.data == DATA
+    assert response.headers['ETag'] == '"abc123"'
+    assert response.cache_control.public and response.cache_control.immutable
+    assert response.cache_control.max_age == 365 * 24 * 3600
+
+
+def test_matching_etag_returns_not_modified(media):
+    response = media.get('/media/abc123.mp3', headers={'If-None-Match': '"abc123"'})
+
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_range_request_returns_partial_content(media):
+    response = media.get('/media/abc123.mp3', headers={'Range': 'bytes=100-199'})
+
+    assert response.status_code == 206
+    assert response.data == DATA[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(DATA)}'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+
+
+@pytest.mark.parametrize('path', ['/media/missing.mp3', '/media/..%2Fsecret.txt', '/media/%2E%2E'])
+def test_missing_or_outside_files_are_not_found(app, media, path):
+    # '..%2F' 는 라우팅에서, '..' 는 safe_join 에서 막힘
+    with open(os.path.join(os.path.dirname(app.app.config['UPLOAD_FOLDER']), 'secret.txt'), 'w') as f:
+        f.write('secret')
+
+    assert media.get(path).status_code == 404
+
+
+def test_x_accel_hands_the_file_to_nginx(app, media, monkeypatch):
+    monkeypatch.setitem(app.app.config, 'MEDIA_OFFLOAD', 'x-accel')
+
+    response = media.get('/media/abc123.mp3')
+    assert response.status_code == 200
+    assert response.headers['X-Accel-Redirect'] == '/_uploads/abc123.mp3'
+    assert response.mimetype == 'audio/mpeg'
+    assert response.data == b''
+    assert media.get('/media/%2E%2E').status_code == 404
+    assert media.get('/media/missing.mp3').status_code == 404
@@ -0,0 +1,33 @@
+from flask import Flask
+
+from metrics import RequestMetrics
+
+
+def make_app():
+    app = Flask(__name__)
+    metrics = RequestMetrics(app)
+
+    @app.route('/plain')
+    def plain():
+        return 'ok'
+
+    @app.route('/events')
+    def events():
+        return app.response_class(iter(['retry: 5000\n\n']), mimetype='text/event-stream')
+
+    return app, metrics
+
+
+def test_streams_are_kept_out_of_request_latency():
+    app, metrics = make_app()
+    client = app.test_client()
+    client.get('/plain').close()
+    response = client.get('/events')
+    response.get_data()
+    response.close()
+
+    output = metrics.render()
+    assert 'http_request_duration_seconds_count{route="/plain",method="GET",status="200"} 1' in output
+    assert 'route="/events"' not in ''.join(line for line in output.splitlines()
+                                            if line.startswith(('http_request_duration', 'http_request_phase')))
+    assert 'http_stream_duration_seconds_count{route="/events",status="200"} 1' in output
@@ -0,0 +1,17 @@
+import pytest
+from flask import Flask
+
+from mongo import configure
+
+
+def test_uri_is_read_from_the_environment(monkeypatch):
+    monkeypatch.setenv('MONGODB_URI', 'mongodb://db.internal:27017')
+    app = Flask(__name__)
+    configure(app)
+    assert app.config['MONGO_URI'] == 'mongodb://db.internal:27017'
+
+
+def test_missing_uri_fails_loudly(monkeypatch):
+    monkeypatch.delenv('MONGODB_URI', raising=False)
+    with pytest.raises(RuntimeError, match='MONGODB_URI'):
+        configure(Flask(__name__))
@@ -0,0 +1,60 @@
+import pytest
+
+from repository import Message
+
+
+@pytest.fixture
+def board(app, client, monkeypatch):
+    monkeypatch.setattr(app, 'NOTES_WINDOW_LIMIT', 3)
+    notes = [app.message_repository.insert(Message(content=f'note {i}', recipient_id=str(client.user._id),
+                                                   author='owner', author_id=client.user._id, newx=i, newy=y))
+             for i, y in enumerate([0, 50, 50, 50, 50, 50, 120])]
+    return [str(note._id) for note in notes]
+
+
+def fetch_all(client, board_id, area):
+    # 응답의 next 가 없을 때까지 같은 영역을 이어서 요청 (paper.html 의 fetchNotes 와 같은 순서)
+    ids, query = [], dict(area)
+    while True:
+        res = client.get(f'/paper/{board_id}/notes', query_string=query).get_json()
+        ids += [note['id'] for note in res['notes']]
+        if res['next'] is None:
+            return ids, res
+        query = {**area, **{key: '' if value is None else value for key, value in res['next'].items()}}
+
+
+def test_window_is_paged_without_losing_notes(client, board):
+    ids, last = fetch_all(client, client.user._id, {'y0': 0, 'y1': 1000})
+    assert ids == board
+    assert last['extent'] == 120
+
+
+def test_window_limit_on_a_single_row(client, board):
+    # 새 쪽지 알림(note-created)처럼 한 줄만 요청해도 개수 제한에 걸린 나머지를 받음
+    ids, _ = fetch_all(client, client.user._id, {'y0': 50, 'y1': 51})
+    assert ids == board[1:6]
+
+
+def test_invalid_cursor(client, board):
+    response = client.get(f'/paper/{client.user._id}/notes', query_string={'after_id': 'nope'})
+    assert response.status_code == 400
+
+
+def test_band_requests_share_the_cache(app, client, board, make_user, monkeypatch):
+    calls = []
+    load_board_window = app.load_board_window
+    monkeypatch.setattr(app, 'load_board_window', lambda *args: calls.append(args) or load_board_window(*args))
+
+    ids, _ = fetch_all(client, client.user._id, {'band': 0})
+    assert ids == board
+
+    # 다른 사람이 같은 구간을 요청하면 DB 조회 없이 캐시에서
+    viewer = app.app.test_client()
+    other = make_user('viewer')
+    viewer.set_cookie('token', app.create_jwt_token(other._id, other))
+    loads = len(calls)
+    assert fetch_all(viewer, client.user._id, {'band': 0})[0] == board
+    assert len(calls) == loads
+
+    assert fetch_all(client, client.user._id, {'band': 1})[0] == []
+    assert client.get(f'/paper/{client.user._id}/notes', query_string={'band': -1}).status_code == 400
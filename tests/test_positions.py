@@ -0,0 +1,56 @@
+import pytest
+
+from repository import Message
+
+
+@pytest.fixture
+def notes(app, client, make_user):
+    # 내 보드의 쪽지 하나와 다른 사람 보드의 쪽지 하나
+    other = make_user('other')
+    mine = app.message_repository.insert(Message(content='mine', recipient_id=str(client.user._id), newx=0, newy=0))
+    theirs = app.message_repository.insert(Message(content='theirs', recipient_id=str(other._id), newx=0, newy=0))
+    return mine, theirs
+
+
+def drain(subscription):
+    events = []
+    while True:
+        item = subscription.get(timeout=0)
+        if item is None:
+            return events
+        events.append(item)
+
+
+def test_move_is_published_to_the_stored_board(app, client, notes):
+    mine, theirs = notes
+    subscriptions = {board: app.event_broker.subscribe(f'paper:{board}')
+                     for board in (mine.recipient_id, theirs.recipient_id)}
+    try:
+        # recipient 를 보내지 않아도 저장된 쪽지의 보드로
+        response = client.post('/xy_update', json={'moves': [
+            {'id': str(mine._id), 'newX': 10, 'newY': 20},
+            {'id': str(theirs._id), 'newX': 30, 'newY': 40},
+        ]})
+        assert response.status_code == 204
+        assert drain(subscriptions[mine.recipient_id]) == [('note-moved', {'id': str(mine._id), 'x': 10, 'y': 20})]
+        assert drain(subscriptions[theirs.recipient_id]) == [('note-moved', {'id': str(theirs._id), 'x': 30, 'y': 40})]
+    finally:
+        for subscription in subscriptions.values():
+            subscription.close()
+
+
+def test_moves_outside_the_requested_board_are_ignored(app, client, notes):
+    mine, theirs = notes
+    subscription = app.event_broker.subscribe(f'paper:{mine.recipient_id}')
+    try:
+        client.post('/xy_update', json={'recipient': mine.recipient_id, 'moves': [
+            {'id': str(theirs._id), 'newX': 30, 'newY': 40},  # 다른 보드의 쪽지
+            {'id': 'not-an-id', 'newX': 1, 'newY': 1},
+            {'id': str(mine._id), 'newX': 10, 'newY': 20},
+        ]})
+        assert drain(subscription) == [('note-moved', {'id': str(mine._id), 'x': 10, 'y': 20})]
+    finally:
+        subscription.close()
+
+    assert (app.message_repository.get(mine._id).newx, app.message_repository.get(mine._id).newy) == (10, 20)
+    assert (app.message_repository.get(theirs._id).newx, app.message_repository.get(theirs._id).newy) == (0, 0)
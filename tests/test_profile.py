@@ -0,0 +1,44 @@
+import io
+import os
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+
+def save(app, data):
+    return app.upload_store.save(FileStorage(stream=io.BytesIO(data), filename='pic.txt'), 'txt')
+
+
+@pytest.fixture
+def stale(app, client):
+    # 이 워커의 캐시에는 예전 사진(old)이 남아 있고, 다른 워커에서 사진을 current 로 바꾼 상태
+    user_id = client.user._id
+    old = save(app, b'old picture')
+    save(app, b'old picture')  # 쪽지에도 첨부된 같은 파일
+    app.user_repository.update_profile(user_id, 'owner', 'owner', old)
+    app.user_cache.set(user_id, app.user_repository.get(user_id))
+
+    current = save(app, b'current picture')
+    app.user_repository.update_profile(user_id, 'owner', 'owner', current)
+    app.upload_store.release(old)
+    return old, current
+
+
+def test_edit_profile_releases_the_stored_picture(app, client, stale):
+    old, current = stale
+    client.post('/edit_profile', data={
+        'name': 'owner', 'nickname': 'owner', 'profile_pic': (io.BytesIO(b'new picture'), 'new.txt')
+    }, content_type='multipart/form-data')
+
+    assert os.path.exists(app.upload_store.path(old))  # 쪽지가 아직 참조 중
+    assert not os.path.exists(app.upload_store.path(current))
+    assert app.user_repository.get(client.user._id).profile_picture not in (old, current)
+
+
+def test_delete_profile_cleans_up_the_stored_picture(app, client, stale):
+    old, current = stale
+    client.post('/delete_profile')
+
+    assert app.user_repository.get(client.user._id) is None
+    job = app.db['jobs'].find_one({'type': 'delete_account'})
+    assert job['args']['profile_picture'] == current
@@ -0,0 +1,29 @@
+from flask import Flask
+
+from profiling import RequestProfiler, StackSampler
+
+
+def test_sampler_leaves_when_the_request_context_ends():
+    app = Flask(__name__)
+    sampler = StackSampler(store=None, hz=0.001, window=3600)  # 샘플링 스레드는 사실상 멈춰 있음
+    RequestProfiler(app, sampler=sampler)
+    seen = []
+
+    @app.route('/')
+    def index():
+        seen.append(dict(sampler.active))
+        return 'ok'
+
+    @app.route('/fail')
+    def fail():
+        raise RuntimeError('boom')
+
+    client = app.test_client()
+    # 응답을 아직 닫지 않았어도 요청 컨텍스트가 끝나면 샘플링 대상에서 빠짐
+    response = client.get('/', buffered=False)
+    assert list(seen[0].values()) == ['/']
+    assert sampler.active == {}
+    response.close()
+
+    assert client.get('/fail').status_code == 500
+    assert sampler.active == {}
@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+
+import pytest
+
+from repository import Message, make_repositories
+
+
+@pytest.fixture(params=['mongo', 'memory'])
+def repositories(request, db):
+    # 두 저장소가 같은 결과를 내는지 같은 테스트로 확인
+    return make_repositories(request.param, db)
+
+
+def add_note(messages, recipient_id, x, y, rev=None, **fields):
+    return messages.insert(Message(content='note', recipient_id=recipient_id, author='author', newx=x, newy=y,
+                                   rev=rev, **fields))
+
+
+def test_board_window_filters_by_rectangle(repositories):
+    users, messages = repositories
+    inside = [add_note(messages, 'board', 10, y) for y in (300, 100, 200)]
+    add_note(messages, 'board', 10, 500)  # 아래
+    add_note(messages, 'board', 900, 150)  # 오른쪽
+    add_note(messages, 'other', 10, 150)  # 다른 보드
+
+    window = messages.board_window('board', 0, 50, 800, 400, 10)
+    assert [message._id for message in window] == [inside[1]._id, inside[2]._id, inside[0]._id]
+
+
+def test_board_window_includes_unmoved_notes_at_origin(repositories):
+    users, messages = repositories
+    legacy = add_note(messages, 'board', None, None)
+    moved = add_note(messages, 'board', 10, 10)
+
+    assert [message._id for message in messages.board_window('board', 0, 0, 800, 100, 10)] == [legacy._id, moved._id]
+    assert [message._id for message in messages.board_window('board', 0, 100, 800, 200, 10)] == []
+
+
+def test_changed_since_orders_by_revision(repositories):
+    users, messages = repositories
+    notes = [add_note(messages, 'board', 0, 0, rev=rev) for rev in (3, 1, 2)]
+
+    assert [message.rev for message in messages.changed_since('board', 1, 10)] == [2, 3]
+    assert [message._id for message in messages.changed_since('board', 0, 2)] == [notes[1]._id, notes[2]._id]
+
+
+def test_sync_author_updates_snapshots_in_batches(repositories):
+    users, messages = repositories
+    author = users.create('author', 'password', 'Author', 'old')
+    for board in ('a', 'b', 'c'):
+        add_note(messages, board, 0, 0, author_id=author._id)
+
+    assert sorted(messages.sync_author(author._id, 'new', 2) + messages.sync_author(author._id, 'new', 2)) == ['a', 'b', 'c']
+    assert messages.sync_author(author._id, 'new', 2) == []
+    assert {message.author for message in messages.authored_by(author._id)} == {'new'}
+
+
+def test_sync_stamps_a_revision_per_note(repositories):
+    users, messages = repositories
+    author = users.create('author', 'password', 'Author', 'old')
+    add_note(messages, 'board', 0, 0, rev=1, author_id=author._id, recipient_name='Board')
+    add_note(messages, 'board', 0, 0, rev=2, author_id=author._id, recipient_name='Board')
+
+    @contextmanager
+    def revision(count):
+        yield 10
+
+    messages.sync_author(author._id, 'new', 10, revision=revision)
+    assert sorted(message.rev for message in messages.changed_since('board', 2, 10)) == [10, 11]
+    messages.sync_recipient('board', 'Renamed', 10, revision=revision)
+    assert sorted(message.rev for message in messages.changed_since('board', 2, 10)) == [10, 11]
+    assert {message.recipient_name for message in messages.changed_since('board', 2, 10)} == {'Renamed'}
+
+
+def test_board_window_pages_through_notes_on_the_same_row(repositories):
+    users, messages = repositories
+    legacy = [add_note(messages, 'board', None, None) for _ in range(2)]
+    row = [add_note(messages, 'board', x, 100) for x in range(5)]
+    below = add_note(messages, 'board', 0, 300)
+
+    # limit 보다 많은 쪽지가 같은 y 에 있어도 (y, _id) 커서로 이어 받으면 빠지는 쪽지가 없음
+    pages, after = [], None
+    while True:
+        page = messages.board_window('board', None, 0, None, 1000, 3, after)
+        pages.append([message._id for message in page])
+        if len(page) < 3:
+            break
+        after = (page[-1].newy, page[-1]._id)
+
+    assert pages == [[legacy[0]._id, legacy[1]._id, row[0]._id],
+                     [row[1]._id, row[2]._id, row[3]._id],
+                     [row[4]._id, below._id]]
@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta, timezone
+
+from revisions import RevisionCounter
+
+
+def test_allocate_returns_consecutive_numbers(db):
+    revisions = RevisionCounter(db['counters'], db['leases'])
+    with revisions.allocate(3) as first:
+        assert first == 1
+    with revisions.allocate() as rev:
+        assert rev == 4
+    assert revisions.current() == revisions.safe() == 4
+    assert db['leases'].count_documents({}) == 0
+
+
+def test_safe_stops_below_writes_in_flight(db):
+    revisions = RevisionCounter(db['counters'], db['leases'])
+    with revisions.allocate() as first:
+        assert first == 1
+        # 더 큰 번호의 쓰기가 먼저 끝나도 1번이 끝날 때까지는 0 까지만
+        with revisions.allocate(2) as second:
+            assert second == 2
+        assert revisions.current() == 3
+        assert revisions.safe() == 0
+    assert revisions.safe() == 3
+
+
+def test_expired_lease_is_ignored(db):
+    revisions = RevisionCounter(db['counters'], db['leases'], lease_seconds=60)
+    with revisions.allocate():
+        pass
+    # 번호를 받고 쓰기 전에 죽은 프로세스의 기록
+    db['leases'].insert_one({'floor': 2, 'at': datetime.now(timezone.utc) - timedelta(seconds=120)})
+    with revisions.allocate() as rev:
+        assert rev == 2
+    assert revisions.safe() == 2
@@ -0,0 +1,217 @@
+import io
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from storage import OrphanCollector, UploadStore
+
+
+@pytest.fixture
+def store(db, tmp_path):
+    return UploadStore(str(tmp_path / 'uploads'), db['uploads'])
+
+
+def upload(data):
+    return FileStorage(stream=io.BytesIO(data), filename='note.txt')
+
+
+def test_same_content_is_stored_once(store):
+    first = store.save(upload(b'hello'), 'txt')
+    second = store.save(upload(b'hello'), 'txt')
+
+    assert first == second
+    assert first.startswith('uploads/') and first.endswith('.txt')
+    assert os.listdir(store.upload_folder) == [os.path.basename(first)]
+    assert store.collection.find_one({'_id': os.path.basename(first)})['refs'] == 2
+
+
+def test_file_removed_when_last_reference_released(store):
+    file_url = store.save(upload(b'hello'), 'txt')
+    store.save(upload(b'hello'), 'txt')
+    other = store.save(upload(b'other'), 'txt')
+
+    store.release(file_url)
+    assert os.path.exists(store.path(file_url))
+
+    store.release(file_url)
+    assert not os.path.exists(store.path(file_url))
+    assert store.collection.find_one({'_id': os.path.basename(file_url)}) is None
+    assert os.path.exists(store.path(other))
+
+
+def test_saved_again_after_release(store):
+    file_url = store.save(upload(b'hello'), 'txt')
+    store.release(file_url)
+
+    assert store.save(upload(b'hello'), 'txt') == file_url
+    with open(store.path(file_url), 'rb') as f:
+        assert f.read() == b'hello'
+
+
+def test_release_of_legacy_file_without_blob(store):
+    # 내용 해시로 저장하기 전의 (uuid 이름) 파일은 참조 수 없이 바로 삭제
+    os.makedirs(store.upload_folder)
+    legacy = os.path.join(store.upload_folder, 'legacy.png')
+    open(legacy, 'wb').close()
+
+    store.release('uploads/legacy.png')
+    assert not os.path.exists(legacy)
+    store.release(None)
+
+
+class Interleaved:
+    # 문서를 지우기 직전(또는 직후)에 action 을 한 번 실행하는 컬렉션 (다른 요청이 끼어든 상황)
+    def __init__(self, collection, action, after):
+        self.collection = collection
+        self.action = action
+        self.after = after
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    def delete_one(self, *args, **kwargs):
+        action, self.action = self.action, None
+        if action and not self.after:
+            action()
+        result = self.collection.delete_one(*args, **kwargs)
+        if action and self.after:
+            action()
+        return result
+
+
+@pytest.mark.parametrize('after', [False, True], ids=['before-delete', 'after-delete'])
+def test_save_during_release_keeps_the_file(store, after):
+    file_url = store.save(upload(b'hello'), 'txt')
+    saved = []
+    store.collection = Interleaved(store.collection, lambda: saved.append(store.save(upload(b'hello'), 'txt')), after)
+
+    store.release(file_url)
+
+    assert saved == [file_url]
+    with open(store.path(file_url), 'rb') as f:
+        assert f.read() == b'hello'
+    blob = store.collection.find_one({'_id': os.path.basename(file_url)})
+    assert blob['refs'] == 1
+    assert 'deleting' not in blob
+    assert os.listdir(store.upload_folder) == [os.path.basename(file_url)]
+
+    store.release(file_url)
+    assert not os.path.exists(store.path(file_url))
+
+
+def test_release_skips_a_file_being_deleted(store):
+    file_url = store.save(upload(b'hello'), 'txt')
+    filename = os.path.basename(file_url)
+    # 다른 프로세스가 막 삭제를 시작함
+    store.collection.update_one({'_id': filename}, {'$set': {'deleting': 'other', 'deleting_at': datetime.now(timezone.utc)}})
+
+    store.release(file_url)
+    assert os.path.exists(store.path(file_url))
+
+    # 삭제하던 프로세스가 죽어서 표시만 남았으면 claim_seconds 뒤에 이어서 삭제
+    store.collection.update_one({'_id': filename}, {'$set': {'deleting_at': datetime.now(timezone.utc) - timedelta(minutes=5)}})
+    store.release(file_url)
+    assert not os.path.exists(store.path(file_url))
+    assert store.collection.find_one({'_id': filename}) is None
+
+
+@pytest.fixture
+def collector(store, db, tmp_path):
+    # referenced 에 넣은 file_url 만 DB에서 참조 중인 것으로 봄
+    collector = OrphanCollector(store, str(tmp_path / 'quarantine'), lambda urls: collector.referenced & set(urls),
+                                db['gc_state'], grace_seconds=60, quarantine_seconds=3600)
+    collector.referenced = set()
+    os.makedirs(store.upload_folder)
+    return collector
+
+
+def put(folder, name, age, data=b'data'):
+    path = os.path.join(folder, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    then = time.time() - age
+    os.utime(path, (then, then))
+    return path
+
+
+def test_orphan_is_quarantined_then_deleted(collector, store):
+    kept = put(store.upload_folder, 'kept.png', 600)
+    orphan = put(store.upload_folder, 'orphan.png', 600)
+    collector.referenced = {'uploads/kept.png'}
+
+    report = collector.run_batch()
+    assert (report['quarantined'], report['deleted'], report['done']) == (1, 0, True)
+    assert os.path.exists(kept)
+    assert not os.path.exists(orphan)
+    quarantined = os.path.join(collector.quarantine_folder, 'orphan.png')
+    assert os.path.exists(quarantined)
+
+    # 보관 기간이 지나기 전에는 그대로
+    assert collector.run_batch()['deleted'] == 0
+    assert os.path.exists(quarantined)
+
+    then = time.time() - 7200
+    os.utime(quarantined, (then, then))
+    report = collector.run_batch()
+    assert (report['deleted'], report['bytes_reclaimed']) == (1, 4)
+    assert not os.path.exists(quarantined)
+    assert os.path.exists(kept)
+
+
+def test_new_uploads_are_left_alone_during_grace_period(collector, store):
+    fresh = put(store.upload_folder, 'fresh.png', 10)
+    temp = put(store.upload_folder, '.tmp-upload', 10)
+
+    report = collector.run_batch()
+    assert (report['quarantined'], report['deleted']) == (0, 0)
+    assert os.path.exists(fresh) and os.path.exists(temp)
+
+
+def test_quarantined_file_restored_when_referenced_again(collector, store):
+    put(store.upload_folder, 'pic.png', 600)
+    collector.run_batch()
+    quarantined = os.path.join(collector.quarantine_folder, 'pic.png')
+    then = time.time() - 7200
+    os.utime(quarantined, (then, then))
+
+    # 격리된 사이에 다시 참조됨
+    collector.referenced = {'uploads/pic.png'}
+    report = collector.run_batch()
+    assert (report['restored'], report['deleted']) == (1, 0)
+    assert os.path.exists(os.path.join(store.upload_folder, 'pic.png'))
+    assert not os.path.exists(quarantined)
+
+
+def test_leftover_temp_files_are_swept(collector, store):
+    temp = put(store.upload_folder, '.tmp-upload', 600, b'partial')
+    hidden = put(store.upload_folder, '.keep', 600)
+
+    report = collector.run_batch()
+    assert (report['deleted'], report['bytes_reclaimed'], report['quarantined']) == (1, 7, 0)
+    assert not os.path.exists(temp)
+    assert os.path.exists(hidden)
+
+
+def test_dry_run_changes_nothing(collector, store):
+    orphan = put(store.upload_folder, 'orphan.png', 600)
+    temp = put(store.upload_folder, '.tmp-upload', 600)
+
+    report = collector.run_batch(dry_run=True)
+    assert (report['quarantined'], report['deleted']) == (1, 1)
+    assert os.path.exists(orphan) and os.path.exists(temp)
+    assert collector.state_collection.find_one({'_id': 'upload_gc'}) is None
+
+
+def test_batches_resume_from_the_cursor(collector, store):
+    for name in ('a.png', 'b.png', 'c.png'):
+        put(store.upload_folder, name, 600)
+    collector.referenced = {'uploads/a.png', 'uploads/b.png', 'uploads/c.png'}
+
+    assert collector.run_batch(batch_size=2)['done'] is False
+    assert collector.state_collection.find_one({'_id': 'upload_gc'})['cursor'] == 'b.png'
+    report = collector.run_batch(batch_size=2)
+    assert (report['scanned'], report['done']) == (1, True)
+    assert collector.state_collection.find_one({'_id': 'upload_gc'})['cursor'] == ''
@@ -0,0 +1,42 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+UI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'UI')
+
+
+def load(name, filename):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(UI, filename))
+    module = sys.modules[name] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='module')
+def ui(app_module):
+    # UI/app.py 도 메인 app 과 이름이 같으므로 파일로 불러옴 (hashing 은 UI 폴더의 것을 사용)
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')  # 시작할 때 cost 측정을 건너뜀
+    if 'hashing' not in sys.modules:
+        load('hashing', 'hashing.py')
+    return load('ui_app', 'app.py')
+
+
+@pytest.fixture
+def stale_client(ui):
+    # 로그인한 뒤 다른 곳에서 탈퇴해서 세션만 남은 상태
+    client = ui.app.test_client()
+    with client.session_transaction() as session:
+        session['username'] = 'gone'
+    return client
+
+
+@pytest.mark.parametrize('method, path, data', [
+    ('post', '/message', {'recipient_id': '0' * 24, 'content': 'hello', 'theme': 'yellow'}),
+    ('get', '/my_messages', None),
+    ('get', '/edit_profile', None),
+])
+def test_deleted_user_with_stale_session(stale_client, method, path, data):
+    response = getattr(stale_client, method)(path, data=data)
+    assert response.status_code == 404
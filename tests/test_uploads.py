@@ -0,0 +1,57 @@
+import hashlib
+import io
+import os
+
+import pytest
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+
+
+def post_note(client, filename, data):
+    return client.post('/message', data={
+        'recipient_id': str(client.user._id), 'content': 'hello', 'theme': 'yellow', 'file': (io.BytesIO(data), filename)
+    }, content_type='multipart/form-data')
+
+
+def uploaded_files(app):
+    folder = app.app.config['UPLOAD_FOLDER']
+    return sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+
+
+def test_upload_is_stored_under_its_hash(app, client):
+    response = post_note(client, 'pic.png', PNG)
+
+    assert response.status_code == 302
+    assert uploaded_files(app) == [f'{hashlib.sha256(PNG).hexdigest()}.png']
+    [note] = app.message_repository.for_board(str(client.user._id))
+    assert note.file_url == f'uploads/{hashlib.sha256(PNG).hexdigest()}.png'
+
+
+def test_oversize_upload_is_rejected(app, client, monkeypatch):
+    monkeypatch.setitem(app.app.config['UPLOAD_MAX_SIZES'], 'txt', 10)
+    response = post_note(client, 'note.txt', b'x' * 100)
+
+    assert response.status_code == 413
+    assert uploaded_files(app) == []  # 임시 파일도 남지 않음
+    assert list(app.message_repository.for_board(str(client.user._id))) == []
+
+
+@pytest.mark.parametrize('filename, data', [
+    ('pic.png', b'GIF89a' + b'\x00' * 32),  # 앞부분이 다른 형식
+    ('pic.jpg', b'\xff\xd8'),  # SNIFF_BYTES 보다 짧음
+])
+def test_content_not_matching_extension_is_rejected(app, client, filename, data):
+    response = post_note(client, filename, data)
+
+    assert response.status_code == 415
+    assert uploaded_files(app) == []
+    assert list(app.message_repository.for_board(str(client.user._id))) == []
+
+
+def test_disallowed_extension_is_not_written(app, client):
+    response = post_note(client, 'run.exe', b'MZ' + b'\x00' * 32)
+
+    assert response.status_code == 302
+    assert uploaded_files(app) == []
+    [note] = app.message_repository.for_board(str(client.user._id))
+    assert note.file_url is None
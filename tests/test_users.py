@@ -0,0 +1,46 @@
+import re
+from html import unescape
+from urllib.parse import unquote
+
+
+def next_cursor(html):
+    match = re.search(r'href="/users\?after=([^"]+)"', html)
+    return unquote(unescape(match.group(1))) if match else None
+
+
+def test_unchanged_list_returns_not_modified(client):
+    first = client.get('/users', headers={'Accept-Encoding': 'gzip'})
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+    assert etag.startswith('W/')  # gzip 으로 압축한 본문이므로 약한 ETag
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    again = client.get('/users', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+
+
+def test_etag_changes_after_a_user_edit(client):
+    etag = client.get('/users').headers['ETag']
+
+    client.post('/edit_profile', data={'name': 'Renamed', 'nickname': 'owner'})
+
+    response = client.get('/users', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert 'Renamed' in response.get_data(as_text=True)
+
+
+def test_users_are_paged_by_name(app, client, make_user, monkeypatch):
+    monkeypatch.setattr(app, 'USERS_PAGE_SIZE', 2)
+    for name in ('alice', 'bob', 'carol', 'dave'):
+        make_user(name)
+
+    seen, after = [], None
+    for _ in range(5):
+        html = client.get('/users', query_string={'after': after} if after else {}).get_data(as_text=True)
+        seen += re.findall(r'<a href="/paper/[0-9a-f]{24}">([^<]+)</a>', html)
+        after = next_cursor(html)
+        if after is None:
+            break
+    assert seen == ['alice', 'bob', 'carol', 'dave', 'owner']